@@ -1,12 +1,26 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 import os
 from dotenv import load_dotenv
+from services.storage import open_storage, close_storage
+from services.warmup import chart_warmup
 from routes import result_routes
 # Load environment variables
 load_dotenv()
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # One pooled MongoDB client (sync and Motor) per worker process, shared by every route and
+    # service; with STORAGE_BACKEND=parquet the snapshots are loaded into memory instead.
+    open_storage()
+    # Build every dashboard chart in the background, and again after each ingest.
+    chart_warmup.start()
+    yield
+    await chart_warmup.stop()
+    close_storage()
+
+app = FastAPI(lifespan=lifespan)
 
 # CORS Configuration
 app.add_middleware(
@@ -0,0 +1,225 @@
+"""
+Ingestion throughput benchmark.
+Generates synthetic result CSVs in the Result_data wide format
+(ID,S-7-zip,P-7-zip,...) and runs the insert_data ingestion modes against an
+in-memory MongoDB stand-in (default) or a local MongoDB-compatible server (--uri).
+Reports rows/s, documents/s, round trips and peak memory as JSON.
+Run from the backend folder:
+    python -m benchmarks.ingest_benchmark --datasets 500 --compressors 8 --metric-files 7 -o ingest_bench.json
+"""
+import io
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import tempfile
+import resource
+import tracemalloc
+import contextlib
+from types import SimpleNamespace
+from pymongo import monitoring
+from database import insert_data
+from database.result_frames import KEY_FIELDS
+from database.sources import file_source
+
+# Compressor column names as they appear in the benchmark CSVs.
+COMPRESSOR_COLUMNS = ["7-zip", "paq8", "bsc", "gzip", "zstd", "bzip2", "zpaq", "cmix"]
+# Metric files of one corpus, in the order they are generated.
+METRIC_FILES = ["C.Time.csv", "C.Memory.csv", "C.CPU.csv", "C.Size.csv",
+                "D.Time.csv", "D.Memory.csv", "D.CPU.csv"]
+MODES = ["per-cell", "bulk", "merge", "stream"]
+
+def generate_corpus(folder, datasets, compressors, metric_files, seed=0):
+    """
+    Write `metric_files` wide metric CSVs with `datasets` rows and `compressors`
+    standard/proposed column pairs each into `folder`. Returns the file paths.
+    """
+    if not 1 <= compressors <= len(COMPRESSOR_COLUMNS):
+        raise ValueError(f"compressors must be between 1 and {len(COMPRESSOR_COLUMNS)}")
+    if not 1 <= metric_files <= len(METRIC_FILES):
+        raise ValueError(f"metric files must be between 1 and {len(METRIC_FILES)}")
+    rng = random.Random(seed)
+    os.makedirs(folder, exist_ok=True)
+    columns = [f"{prefix}-{name}" for name in COMPRESSOR_COLUMNS[:compressors] for prefix in ("S", "P")]
+    paths = []
+    for filename in METRIC_FILES[:metric_files]:
+        is_size = "Size" in filename
+        path = os.path.join(folder, filename)
+        with open(path, "w", encoding="utf-8") as fh:
+            fh.write(",".join(["ID"] + (["O.Size"] if is_size else []) + columns) + "\n")
+            for i in range(datasets):
+                original = rng.randint(10_000, 10_000_000)
+                values = [str(rng.randint(original // 6, original // 3)) if is_size else f"{rng.uniform(0, 500):.2f}"
+                          for _ in columns]
+                fh.write(",".join([f"ds{i:06d}"] + ([str(original)] if is_size else []) + values) + "\n")
+        paths.append(path)
+    return paths
+
+class MemoryCollection:
+    """
+    Minimal in-memory stand-in for a pymongo collection: supports the update_one and
+    bulk_write(UpdateOne...) calls used by the ingester and counts round trips.
+    """
+    def __init__(self):
+        self.documents = {}
+        self.round_trips = 0
+
+    def _upsert(self, filter_doc, update):
+        key = tuple(filter_doc[f] for f in KEY_FIELDS)
+        existing = self.documents.get(key)
+        if existing is None:
+            self.documents[key] = dict(update["$set"])
+            return 1, 0
+        changed = any(existing.get(k) != v for k, v in update["$set"].items())
+        existing.update(update["$set"])
+        return 0, int(changed)
+
+    def update_one(self, filter_doc, update, upsert=False):
+        self.round_trips += 1
+        inserted, modified = self._upsert(filter_doc, update)
+        return SimpleNamespace(upserted_id=len(self.documents) if inserted else None, modified_count=modified)
+
+    def bulk_write(self, ops, ordered=True):
+        self.round_trips += 1
+        inserted = modified = 0
+        for op in ops:
+            i, m = self._upsert(op._filter, op._doc)
+            inserted += i
+            modified += m
+        return SimpleNamespace(upserted_count=inserted, modified_count=modified)
+
+    def count_documents(self, _filter=None):
+        return len(self.documents)
+
+class CommandCounter(monitoring.CommandListener):
+    """Counts commands sent to a real server."""
+    def __init__(self):
+        self.count = 0
+
+    def started(self, event):
+        self.count += 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+def run_mode(mode, paths, coll, batch_size, chunk_size):
+    sources = [file_source(path) for path in paths]
+    if mode == "per-cell":
+        stats = [insert_data.process_file(s, coll) for s in sources]
+    elif mode == "bulk":
+        stats = [insert_data.process_file(s, coll, bulk=True, batch_size=batch_size) for s in sources]
+    elif mode == "merge":
+        stats = [insert_data.process_corpus(sources, coll, batch_size=batch_size, label="benchmark")]
+    elif mode == "stream":
+        stats = [insert_data.process_file_streaming(s, coll, chunk_size=chunk_size, batch_size=batch_size)
+                 for s in sources]
+    else:
+        raise ValueError(f"Unknown mode: {mode}")
+    total = insert_data.new_stats()
+    for file_stats in stats:
+        insert_data.add_stats(total, file_stats)
+    return total
+
+def benchmark(mode, paths, rows, make_collection, batch_size, chunk_size):
+    coll, round_trips = make_collection()
+    tracemalloc.start()
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        stats = run_mode(mode, paths, coll, batch_size, chunk_size)
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    documents = stats["inserted"] + stats["modified"]
+    return {
+        "mode": mode,
+        "seconds": round(elapsed, 4),
+        "csv_rows": rows,
+        "rows_per_s": round(rows / elapsed, 1) if elapsed else None,
+        "documents_written": documents,
+        "documents_per_s": round(documents / elapsed, 1) if elapsed else None,
+        "documents_stored": coll.count_documents({}),
+        "round_trips": round_trips(),
+        "failed": stats["failed"],
+        "peak_traced_mb": round(peak / 2**20, 2),
+    }
+
+def memory_collections():
+    def make():
+        coll = MemoryCollection()
+        return coll, lambda: coll.round_trips
+    return make
+
+def server_collections(uri):
+    from pymongo import MongoClient
+    counter = CommandCounter()
+    client = MongoClient(uri, event_listeners=[counter])
+    db = client["ingest_benchmark"]
+
+    def make():
+        db.drop_collection("results")
+        coll = db["results"]
+        start = counter.count
+        return coll, lambda: counter.count - start
+    return make, client
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark Result_data ingestion throughput.")
+    parser.add_argument("--datasets", type=int, default=200)
+    parser.add_argument("--compressors", type=int, default=len(COMPRESSOR_COLUMNS))
+    parser.add_argument("--metric-files", type=int, default=len(METRIC_FILES))
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=MODES)
+    parser.add_argument("--batch-size", type=int, default=insert_data.BULK_BATCH_SIZE)
+    parser.add_argument("--chunk-size", type=int, default=insert_data.STREAM_CHUNK_ROWS)
+    parser.add_argument("--uri", help="run against a local MongoDB-compatible server instead of memory")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("-o", "--output", help="JSON report path (default: stdout)")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    client = None
+    if args.uri:
+        make_collection, client = server_collections(args.uri)
+    else:
+        make_collection = memory_collections()
+    report = {
+        "params": {
+            "datasets": args.datasets,
+            "compressors": args.compressors,
+            "metric_files": args.metric_files,
+            "batch_size": args.batch_size,
+            "chunk_size": args.chunk_size,
+            "backend": "server" if args.uri else "memory",
+        },
+        "environment": {"python": platform.python_version(), "platform": platform.platform()},
+        "results": [],
+    }
+    try:
+        with tempfile.TemporaryDirectory() as folder:
+            paths = generate_corpus(folder, args.datasets, args.compressors, args.metric_files, args.seed)
+            rows = args.datasets * len(paths)
+            for mode in args.modes:
+                result = benchmark(mode, paths, rows, make_collection, args.batch_size, args.chunk_size)
+                report["results"].append(result)
+                print(f"{mode:>8}: {result['rows_per_s']} rows/s, {result['documents_per_s']} docs/s, "
+                      f"{result['round_trips']} round trips", file=sys.stderr)
+    finally:
+        if client is not None:
+            client.drop_database("ingest_benchmark")
+            client.close()
+    report["peak_rss_mb"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 2)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as fh:
+            fh.write(text + "\n")
+    else:
+        print(text)
+
+if __name__ == "__main__":
+    main()
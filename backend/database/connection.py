@@ -0,0 +1,186 @@
+import os
+import threading
+import certifi
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import MongoClient, monitoring
+
+load_dotenv()
+MONGODB_URI = os.getenv("MONGODB_URI", "mongodb://localhost:27017")
+# Upper bound of pooled connections held by the shared client of one process.
+MONGODB_MAX_POOL_SIZE = int(os.getenv("MONGODB_MAX_POOL_SIZE", "100"))
+# Connections kept open even when idle, so bursts do not pay for new TLS handshakes.
+MONGODB_MIN_POOL_SIZE = int(os.getenv("MONGODB_MIN_POOL_SIZE", "0"))
+MONGODB_MAX_IDLE_TIME_MS = int(os.getenv("MONGODB_MAX_IDLE_TIME_MS", "300000"))
+# How long a request may wait for a free pooled connection before failing.
+MONGODB_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv("MONGODB_WAIT_QUEUE_TIMEOUT_MS", "10000"))
+MONGODB_CONNECT_TIMEOUT_MS = int(os.getenv("MONGODB_CONNECT_TIMEOUT_MS", "10000"))
+MONGODB_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGODB_SERVER_SELECTION_TIMEOUT_MS", "10000"))
+MONGODB_SOCKET_TIMEOUT_MS = int(os.getenv("MONGODB_SOCKET_TIMEOUT_MS", "0")) or None
+# TLS is left to MONGODB_URI (mongodb+srv:// and ?tls=true enable it) unless set here.
+MONGODB_TLS = os.getenv("MONGODB_TLS", "").strip().lower()
+# Only for local test servers with self-signed certificates; never set it in production.
+MONGODB_TLS_ALLOW_INVALID_CERTIFICATES = os.getenv(
+    "MONGODB_TLS_ALLOW_INVALID_CERTIFICATES", "false").lower() in ("1", "true", "yes")
+
+_clients = {}
+_async_clients = {}
+_lock = threading.Lock()
+
+class PoolStats(monitoring.ConnectionPoolListener):
+    """Connection pool counters of the shared clients, fed by pymongo's CMAP events."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.created = 0
+            self.closed = 0
+            self.checked_out = 0
+            self.checkouts = 0
+            self.checkout_failures = 0
+            self.wait_seconds_total = 0.0
+            self.wait_seconds_max = 0.0
+            self.pools_cleared = 0
+
+    def _waited(self, duration):
+        if duration is None:
+            return
+        self.wait_seconds_total += duration
+        self.wait_seconds_max = max(self.wait_seconds_max, duration)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "max_pool_size": MONGODB_MAX_POOL_SIZE,
+                "min_pool_size": MONGODB_MIN_POOL_SIZE,
+                "open_connections": self.created - self.closed,
+                "checked_out": self.checked_out,
+                "checkouts": self.checkouts,
+                "checkout_failures": self.checkout_failures,
+                "avg_wait_ms": round(self.wait_seconds_total / self.checkouts * 1000, 3) if self.checkouts else 0.0,
+                "max_wait_ms": round(self.wait_seconds_max * 1000, 3),
+                "pools_cleared": self.pools_cleared,
+            }
+
+    def connection_created(self, event):
+        with self._lock:
+            self.created += 1
+
+    def connection_closed(self, event):
+        with self._lock:
+            self.closed += 1
+
+    def connection_checked_out(self, event):
+        with self._lock:
+            self.checked_out += 1
+            self.checkouts += 1
+            self._waited(event.duration)
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.checked_out -= 1
+
+    def connection_check_out_failed(self, event):
+        with self._lock:
+            self.checkout_failures += 1
+            self._waited(event.duration)
+
+    def pool_cleared(self, event):
+        with self._lock:
+            self.pools_cleared += 1
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_check_out_started(self, event):
+        pass
+
+pool_stats = PoolStats()
+
+def client_options():
+    """Keyword arguments of the shared MongoClient (pool sizes, timeouts, TLS)."""
+    options = {
+        "maxPoolSize": MONGODB_MAX_POOL_SIZE,
+        "minPoolSize": MONGODB_MIN_POOL_SIZE,
+        "maxIdleTimeMS": MONGODB_MAX_IDLE_TIME_MS,
+        "waitQueueTimeoutMS": MONGODB_WAIT_QUEUE_TIMEOUT_MS,
+        "connectTimeoutMS": MONGODB_CONNECT_TIMEOUT_MS,
+        "serverSelectionTimeoutMS": MONGODB_SERVER_SELECTION_TIMEOUT_MS,
+        "socketTimeoutMS": MONGODB_SOCKET_TIMEOUT_MS,
+        "event_listeners": [pool_stats],
+    }
+    if MONGODB_TLS in ("1", "true", "yes"):
+        options.update(tls=True, tlsCAFile=certifi.where())
+    elif MONGODB_TLS in ("0", "false", "no"):
+        options["tls"] = False
+    if MONGODB_TLS_ALLOW_INVALID_CERTIFICATES:
+        options["tlsAllowInvalidCertificates"] = True
+    return options
+
+def require_mongodb_uri():
+    """
+    Fail fast when MONGODB_URI is not configured. The API calls this at startup; the
+    command line tools keep connecting to a local server by default.
+    """
+    if not os.getenv("MONGODB_URI"):
+        raise ValueError("MONGODB_URI is not set in environment variables.")
+
+def get_client():
+    """
+    Return the MongoClient shared by everything running in this process.
+    The client (and its TLS handshakes and connection pool) is created on first use;
+    a forked worker process gets its own client instead of reusing the parent's.
+    """
+    pid = os.getpid()
+    with _lock:
+        _forget_parent_clients(pid)
+        client = _clients.get(pid)
+        if client is None:
+            client = MongoClient(MONGODB_URI, **client_options())
+            _clients[pid] = client
+        return client
+
+def get_async_client():
+    """
+    Return the Motor client shared by the async routes of this process. It uses the
+    same pool options and PoolStats listener as get_client(); create it from within
+    the running event loop (the app lifespan does).
+    """
+    pid = os.getpid()
+    with _lock:
+        _forget_parent_clients(pid)
+        client = _async_clients.get(pid)
+        if client is None:
+            client = AsyncIOMotorClient(MONGODB_URI, **client_options())
+            _async_clients[pid] = client
+        return client
+
+def _forget_parent_clients(pid):
+    # Clients inherited from a parent process must not be used (or closed) here.
+    if any(owner != pid for owner in list(_clients) + list(_async_clients)):
+        _clients.clear()
+        _async_clients.clear()
+        pool_stats.reset()
+
+def close_client():
+    """Close this process's shared clients (sync and async), if they were created."""
+    with _lock:
+        clients = [_clients.pop(os.getpid(), None), _async_clients.pop(os.getpid(), None)]
+    for client in clients:
+        if client is not None:
+            client.close()
+
+def get_pool_stats():
+    """Counters of the shared clients' connection pools (all zero before first use)."""
+    return pool_stats.snapshot()
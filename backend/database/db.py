@@ -14,25 +14,26 @@
 # engine = create_engine(DATABASE_URL, echo=True)
 # SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
-import os
 from pymongo import MongoClient
-from dotenv import load_dotenv
-
-# Load environment variables from .env file
-load_dotenv()
-
-MONGODB_URI = os.getenv("MONGODB_URI")
-if not MONGODB_URI:
-    raise ValueError("MONGODB_URI is not set in environment variables.")
-
-# Create a MongoDB client.
-client = MongoClient(MONGODB_URI)
-
-# Define the two databases based on your requirements.
-db_dna = client["rlr_dna_raw"]
-db_small_genomes = client["rlr_small_genomes_raw"]
-
-# Optionally, you can print confirmation:
-print("Connected to MongoDB and configured databases:")
-print(" - rlr_dna_raw")
-print(" - rlr_small_genomes_raw")
\ No newline at end of file
+from database.connection import get_client, require_mongodb_uri
+
+# The two databases the dashboard reads from.
+DB_DNA = "rlr_dna_raw"
+DB_SMALL_GENOMES = "rlr_small_genomes_raw"
+
+# Define any abbreviations for long database names
+SHORT_DB_NAMES = {
+    "result_less_repetitive_small_genomes_raw": DB_SMALL_GENOMES,
+    "result_less_repetitive_dna_corpus_raw": DB_DNA  # if needed
+}
+
+def normalize_db_name(db_name):
+    """Abbreviate the database name if it exceeds the allowed length."""
+    # You can add any additional logic to check for length if needed.
+    return SHORT_DB_NAMES.get(db_name, db_name)
+
+# FastAPI dependency handing out the process-wide pooled client (opened and closed by
+# the app lifespan); the dashboard reads go through services.storage instead.
+def get_mongo_client() -> MongoClient:
+    require_mongodb_uri()
+    return get_client()
@@ -0,0 +1,198 @@
+"""
+Stream result documents out of MongoDB as CSV, NDJSON or Parquet.
+The cursor is read in batches with a projection, and every batch is encoded and
+handed on before the next one is fetched, so memory stays flat however large the
+collections are. Usable from the API (StreamingResponse) and from the command line:
+    python -m database.export --format ndjson --corpus dna_corpus --compressor gzip -o out.ndjson
+"""
+import io
+import csv
+import sys
+import argparse
+import orjson
+from database.connection import get_client
+
+# Corpus names used by the API, mapped to the databases the ingester writes to.
+CORPUS_DB_NAMES = {
+    "dna_corpus": "rlr_dna_raw",
+    "dna": "rlr_small_genomes_raw",
+}
+COLLECTION_NAME = "results"
+
+KEY_FIELDS = ["dataset_id", "compressor", "compressor_type"]
+RESULT_FIELDS = [
+    "original_size",
+    "compressed_size",
+    "compression_time",
+    "compression_memory",
+    "compression_cpu_usage",
+    "decompression_time",
+    "decompression_memory",
+    "decompression_cpu_usage",
+]
+EXPORT_FORMATS = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+    "parquet": "application/vnd.apache.parquet",
+}
+EXPORT_BATCH_SIZE = 1000
+
+def resolve_corpora(corpora=None):
+    """Return [(corpus, db_name)] for the requested corpus names (all corpora by default)."""
+    if not corpora:
+        return list(CORPUS_DB_NAMES.items())
+    resolved = []
+    for corpus in corpora:
+        key = corpus.lower().strip()
+        if key in CORPUS_DB_NAMES:
+            resolved.append((key, CORPUS_DB_NAMES[key]))
+        elif key in CORPUS_DB_NAMES.values():
+            resolved.append((key, key))
+        else:
+            raise ValueError(f"Unsupported corpus: {corpus}")
+    return resolved
+
+def export_fields(metrics=None):
+    """Return the ordered export columns: corpus, the natural key, dataset_type and the metrics."""
+    if metrics:
+        unknown = [m for m in metrics if m not in RESULT_FIELDS]
+        if unknown:
+            raise ValueError(f"Unsupported metric field(s): {', '.join(unknown)}")
+        metric_fields = [m for m in RESULT_FIELDS if m in metrics]
+    else:
+        metric_fields = list(RESULT_FIELDS)
+    return ["corpus"] + KEY_FIELDS + ["dataset_type"] + metric_fields
+
+def build_query(compressors=None, compressor_types=None):
+    query = {}
+    if compressors:
+        query["compressor"] = {"$in": ["7-zip" if c == "7zip" else c for c in compressors]}
+    if compressor_types:
+        query["compressor_type"] = {"$in": list(compressor_types)}
+    return query
+
+def iter_batches(collections, fields, query=None, batch_size=EXPORT_BATCH_SIZE):
+    """
+    Yield lists of at most `batch_size` export rows from [(corpus, collection)],
+    fetching only the projected fields (no _id) from the server.
+    """
+    projection = {field: 1 for field in fields if field != "corpus"}
+    projection["_id"] = 0
+    for corpus, collection in collections:
+        cursor = collection.find(query or {}, projection).batch_size(batch_size)
+        batch = []
+        for doc in cursor:
+            doc["corpus"] = corpus
+            batch.append(doc)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+def iter_csv(batches, fields):
+    """Encode row batches as CSV text chunks, header first."""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=fields, extrasaction="ignore")
+    writer.writeheader()
+    for batch in batches:
+        writer.writerows(batch)
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+def iter_ndjson(batches, fields):
+    """Encode row batches as newline-delimited JSON chunks."""
+    for batch in batches:
+        yield b"".join(orjson.dumps({f: row.get(f) for f in fields}) + b"\n" for row in batch)
+
+class ChunkSink(io.RawIOBase):
+    """Write-only file object that collects what pyarrow writes so it can be yielded."""
+    def __init__(self):
+        self.chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data, self.chunks = b"".join(self.chunks), []
+        return data
+
+def load_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError as e:
+        raise RuntimeError("Parquet export requires the 'pyarrow' package") from e
+    return pyarrow, pyarrow.parquet
+
+def iter_parquet(batches, fields):
+    """Encode row batches as one Parquet file, one row group per batch."""
+    pa, pq = load_pyarrow()
+    schema = pa.schema([(f, pa.string()) if f in ["corpus"] + KEY_FIELDS + ["dataset_type"]
+                        else (f, pa.float64()) for f in fields])
+    sink = ChunkSink()
+    with pq.ParquetWriter(pa.PythonFile(sink, mode="w"), schema) as writer:
+        for batch in batches:
+            columns = {f: [row.get(f) for row in batch] for f in fields}
+            writer.write_table(pa.Table.from_pydict(columns, schema=schema))
+            data = sink.drain()
+            if data:
+                yield data
+    data = sink.drain()
+    if data:
+        yield data
+
+ENCODERS = {
+    "csv": iter_csv,
+    "ndjson": iter_ndjson,
+    "parquet": iter_parquet,
+}
+
+def stream_export(collections, fmt="csv", compressors=None, compressor_types=None, metrics=None,
+                  batch_size=EXPORT_BATCH_SIZE):
+    """
+    Return an iterator of encoded byte chunks for the given [(corpus, collection)].
+    Invalid arguments raise ValueError before anything is read.
+    """
+    if fmt not in ENCODERS:
+        raise ValueError(f"Unsupported export format: {fmt}")
+    fields = export_fields(metrics)
+    if fmt == "parquet":
+        load_pyarrow()
+    batches = iter_batches(collections, fields, build_query(compressors, compressor_types), batch_size)
+    return ENCODERS[fmt](batches, fields)
+
+def corpus_collections(client, corpora=None):
+    return [(corpus, client[db_name][COLLECTION_NAME]) for corpus, db_name in resolve_corpora(corpora)]
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Export result documents as CSV, NDJSON or Parquet.")
+    parser.add_argument("--format", choices=sorted(ENCODERS), default="csv")
+    parser.add_argument("--corpus", action="append", dest="corpora",
+                        help="dna_corpus, dna or a database name (repeatable, default: all)")
+    parser.add_argument("--compressor", action="append", dest="compressors", help="repeatable")
+    parser.add_argument("--compressor-type", action="append", dest="compressor_types",
+                        choices=["standard", "proposed"])
+    parser.add_argument("--metric", action="append", dest="metrics", choices=RESULT_FIELDS, help="repeatable")
+    parser.add_argument("--batch-size", type=int, default=EXPORT_BATCH_SIZE)
+    parser.add_argument("-o", "--output", help="output file (default: stdout)")
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+    chunks = stream_export(corpus_collections(get_client(), args.corpora), args.format, args.compressors,
+                           args.compressor_types, args.metrics, args.batch_size)
+    out = open(args.output, "wb") if args.output else sys.stdout.buffer
+    try:
+        for chunk in chunks:
+            out.write(chunk)
+    finally:
+        if args.output:
+            out.close()
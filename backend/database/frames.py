@@ -0,0 +1,103 @@
+"""
+Compact, typed DataFrames straight from MongoDB cursors.
+Only the projected fields are fetched (no _id), and each cursor batch is turned
+into typed columns right away: categoricals for the repeated key strings and
+float32/float64 arrays for the metrics, instead of object columns of dicts.
+Strings are normalized at ingest, so nothing is stripped or lowercased here.
+"""
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+LOAD_BATCH_SIZE = 5000
+FRAME_DTYPES = ("category", "string", "float32", "float64")
+
+# Field types of the results collection.
+RESULT_FIELD_TYPES = {
+    "dataset_id": "category",
+    "dataset_key": "category",
+    "compressor": "category",
+    "compressor_type": "category",
+    "dataset_type": "category",
+    "original_size": "float64",
+    "compressed_size": "float64",
+    "compression_time": "float64",
+    "compression_memory": "float64",
+    "compression_cpu_usage": "float64",
+    "decompression_time": "float64",
+    "decompression_memory": "float64",
+    "decompression_cpu_usage": "float64",
+}
+
+def field_types(fields):
+    """{field: dtype} for a list of result fields (a dict is returned as is)."""
+    if isinstance(fields, dict):
+        return fields
+    return {field: RESULT_FIELD_TYPES[field] for field in fields}
+
+def typed_column(values, dtype):
+    if dtype == "category":
+        return pd.Categorical(values)
+    if dtype == "string":
+        return pd.array(values, dtype="string")
+    # Missing fields come back as None and become NaN.
+    return np.array(values, dtype=dtype)
+
+def concat_columns(parts, dtype):
+    if not parts:
+        return typed_column([], dtype)
+    if dtype == "category":
+        return union_categoricals(parts)
+    if dtype == "string":
+        return pd.array(np.concatenate([part.to_numpy() for part in parts]), dtype="string")
+    return np.concatenate(parts)
+
+class FrameBuilder:
+    """Accumulates documents into typed column parts, one cursor batch at a time."""
+    def __init__(self, fields, batch_size=LOAD_BATCH_SIZE):
+        self.types = field_types(fields)
+        unknown = {dtype for dtype in self.types.values() if dtype not in FRAME_DTYPES}
+        if unknown:
+            raise ValueError(f"Unsupported dtype(s): {', '.join(sorted(unknown))}")
+        self.batch_size = batch_size
+        self.parts = {field: [] for field in self.types}
+        self.batch = []
+
+    def projection(self):
+        projection = {field: 1 for field in self.types}
+        projection["_id"] = 0
+        return projection
+
+    def add(self, doc):
+        self.batch.append(doc)
+        if len(self.batch) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self.batch:
+            return
+        for field, dtype in self.types.items():
+            self.parts[field].append(typed_column([doc.get(field) for doc in self.batch], dtype))
+        self.batch = []
+
+    def frame(self):
+        self.flush()
+        return pd.DataFrame({field: concat_columns(self.parts[field], dtype) for field, dtype in self.types.items()})
+
+def load_frame(collection, fields, query=None, batch_size=LOAD_BATCH_SIZE):
+    """
+    Load the documents matching `query` into a DataFrame with one typed column per
+    field. `fields` is a {field: dtype} spec (dtype in FRAME_DTYPES) or a list of
+    results fields typed by RESULT_FIELD_TYPES.
+    """
+    builder = FrameBuilder(fields, batch_size)
+    for doc in collection.find(query or {}, builder.projection()).batch_size(batch_size):
+        builder.add(doc)
+    return builder.frame()
+
+async def load_frame_async(collection, fields, query=None, batch_size=LOAD_BATCH_SIZE):
+    """Async (Motor) version of load_frame."""
+    builder = FrameBuilder(fields, batch_size)
+    async for doc in collection.find(query or {}, builder.projection()).batch_size(batch_size):
+        builder.add(doc)
+    return builder.frame()
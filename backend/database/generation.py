@@ -0,0 +1,30 @@
+"""
+Data generation of a corpus database: a counter kept in its meta collection that
+the ingester increments whenever it writes results, so the API can tell whether
+results it cached are still current.
+"""
+from datetime import datetime, timezone
+from pymongo import ReturnDocument
+
+GENERATION_COLLECTION = "meta"
+GENERATION_ID = "generation"
+
+def bump_generation(db):
+    """Increment the data generation of a database and return the new value."""
+    doc = db[GENERATION_COLLECTION].find_one_and_update(
+        {"_id": GENERATION_ID},
+        {"$inc": {"value": 1}, "$set": {"updated_at": datetime.now(timezone.utc)}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+    return doc["value"]
+
+def fetch_generation(db):
+    """Current data generation of a database (0 before the first ingest)."""
+    doc = db[GENERATION_COLLECTION].find_one({"_id": GENERATION_ID}, {"value": 1})
+    return doc["value"] if doc else 0
+
+async def fetch_generation_async(db):
+    """Async (Motor) version of fetch_generation."""
+    doc = await db[GENERATION_COLLECTION].find_one({"_id": GENERATION_ID}, {"value": 1})
+    return doc["value"] if doc else 0
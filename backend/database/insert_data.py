@@ -1,191 +1,515 @@
+"""
+Load the benchmark CSVs under data/Result_data into MongoDB.
+CSVs may be plain or compressed (.csv.gz/.bz2/.xz/.zst) and may come from .zip or
+.tar(.gz|.zst) drops that mirror the <db>/<collection>/*.csv layout.
+Run from the backend folder:
+    python -m database.insert_data [--bulk | --merge | --incremental | --stream] [--workers N] [--source PATH]
+"""
 import os
-import re
-import pandas as pd
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from dotenv import load_dotenv
-from pymongo import MongoClient
-import certifi
+from pymongo import DeleteMany, UpdateOne
+from pymongo.errors import BulkWriteError
+from database.connection import get_client, close_client
+from database.db import normalize_db_name
+from database.export import stream_export
+from database.frames import RESULT_FIELD_TYPES
+from database.manifest import IngestManifest, MANIFEST_FILENAME, row_fingerprints, stream_digest, split_row_key
+from database.result_frames import (
+    read_metric_frame, iter_metric_chunks, read_corpus_frame, merge_metric_frames, frame_to_documents,
+    not_found_compressors, inserted_compressors,
+)
+from database.summary import refresh_summaries
+from database.generation import bump_generation
+from database.setup_db import NATURAL_KEY_INDEX
+from database.sources import as_source, digest_source, discover_sources, iter_tar_sources
 
 # Load .env config
 load_dotenv()
-MONGODB_URI = os.getenv("MONGODB_URI", "mongodb://localhost:27017")
 # Base folder which has subfolders as database names and inside each, subfolders as collection names.
-BASE_DATA_FOLDER = os.path.join("data", "Result_data")
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+BASE_DATA_FOLDER = os.path.join(PROJECT_ROOT, "data", "Result_data")
+# Number of UpdateOne operations sent per bulk_write call in bulk mode.
+BULK_BATCH_SIZE = int(os.getenv("BULK_BATCH_SIZE", "1000"))
+# Rows read per chunk by --stream runs.
+STREAM_CHUNK_ROWS = int(os.getenv("STREAM_CHUNK_ROWS", "50000"))
+# Manifest of already ingested files used by --incremental runs.
+MANIFEST_PATH = os.getenv("INGEST_MANIFEST_PATH", os.path.join(BASE_DATA_FOLDER, MANIFEST_FILENAME))
 
-EXPECTED_COMPRESSORS = {"7-zip", "paq8px", "bsc",
-                        "gzip", "zstd", "bzip2", "zpaq", "cmix"}
-
-COLUMN_MAP = {
-    "cpu": "cpu_usage",
-    "time": "time",
-    "memory": "memory",
-    "size": "ratio"
-}
+# Number of worker processes used by process_all_files (1 = sequential).
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "1"))
 
 skipped_files = []
-not_found_compressors = set()
-inserted_compressors = set()
-
-# Define any abbreviations for long database names
-SHORT_DB_NAMES = {
-    "result_less_repetitive_small_genomes_raw": "rlr_small_genomes_raw",
-    "result_less_repetitive_dna_corpus_raw": "rlr_dna_raw"  # if needed
-}
-
-def normalize_db_name(db_name):
-    """Abbreviate the database name if it exceeds the allowed length."""
-    # You can add any additional logic to check for length if needed.
-    return SHORT_DB_NAMES.get(db_name, db_name)
+known_collections = set()
+# (compressor, compressor_type) groups written per collection, for the summary refresh.
+touched_groups = {}
 
 def get_collection(db_name, collection_name):
     """
-    Return a MongoDB collection from the specified database.
-    If the collection doesn't exist, create it before returning.
+    Return a MongoDB collection from the specified database, using the process-wide
+    pooled client. If the collection doesn't exist, create it before returning.
     """
     # Normalize the database name if needed:
     db_name = normalize_db_name(db_name)
-    
-    client = MongoClient(
-        MONGODB_URI,
-        tls=True,
-        tlsCAFile=certifi.where(),
-        tlsAllowInvalidCertificates=True  # for testing; remove in production!
-    )
-    db = client[db_name]
-    if collection_name not in db.list_collection_names():
-        db.create_collection(collection_name)
-        print(f"Collection '{collection_name}' created in database '{db_name}'.")
-    return client, db[collection_name]
+    db = get_client()[db_name]
+    if (db_name, collection_name) not in known_collections:
+        if collection_name not in db.list_collection_names():
+            db.create_collection(collection_name)
+            print(f"Collection '{collection_name}' created in database '{db_name}'.")
+        known_collections.add((db_name, collection_name))
+    return db[collection_name]
+
+def ensure_natural_key_index(coll):
+    """
+    Create the unique natural key index (see setup_db) on a results collection, so that
+    concurrent upserts of the same key cannot insert duplicates. Returns False when it
+    cannot be created, e.g. because the collection already holds duplicate keys.
+    """
+    name, keys, options = NATURAL_KEY_INDEX
+    try:
+        coll.create_index(keys, name=name, **options)
+        return True
+    except Exception as e:
+        print(f"Could not create the unique {name} index on {coll.full_name}: {e}")
+        return False
 
 def clear_collection(db_name, collection_name):
     """Clear the target collection."""
-    client, coll = get_collection(db_name, collection_name)
     try:
+        coll = get_collection(db_name, collection_name)
         coll.delete_many({})
         print(f"Collection '{collection_name}' in database '{normalize_db_name(db_name)}' cleared successfully")
     except Exception as e:
         print(f"Clear collection failed for {db_name}.{collection_name}: {e}")
-    finally:
-        client.close()
 
-def clean_float(val):
-    try:
-        if pd.isna(val) or val == '':
-            return 0.0
-        return float(val)
-    except Exception:
-        return 0.0
+def document_filter(doc):
+    """Return the natural key filter (dataset_id, compressor, compressor_type) of a document."""
+    return {
+        "dataset_id": doc["dataset_id"],
+        "compressor": doc["compressor"],
+        "compressor_type": doc["compressor_type"]
+    }
 
 def upsert_document(doc, coll):
     """
     Update an existing document or insert a new one based on the unique key:
     (dataset_id, compressor, compressor_type).
     """
-    filter_doc = {
-        "dataset_id": doc["dataset_id"],
-        "compressor": doc["compressor"],
-        "compressor_type": doc["compressor_type"]
-    }
-    coll.update_one(filter_doc, {"$set": doc}, upsert=True)
-
-def normalize_compressor(name):
-    name = name.lower().replace("s-", "").replace("p-", "")
-    if name.startswith("paq8"):
-        return "paq8px"
-    for expected in EXPECTED_COMPRESSORS:
-        if expected.replace("-", "") in name.replace("-", ""):
-            return expected
-    not_found_compressors.add(name)
-    return None
-
-def process_file(file_path, coll):
-    filename = os.path.basename(file_path)
+    return coll.update_one(document_filter(doc), {"$set": doc}, upsert=True)
+
+def mark_touched(coll, doc):
+    touched_groups.setdefault(getattr(coll, "full_name", None), set()).add((doc["compressor"], doc["compressor_type"]))
+
+def refresh_touched_summaries(coll, label=""):
+    """
+    Recompute the summary documents of the groups written to `coll` since the last
+    refresh, then bump the data generation of its database so the API drops cached results.
+    """
+    groups = touched_groups.pop(getattr(coll, "full_name", None), set())
+    if not groups:
+        return
     try:
-        df = pd.read_csv(file_path)
-        mode = 'compression' if filename.startswith('C') else 'decompression'
-        match = re.search(r"(cpu|memory|time|size)", filename, re.IGNORECASE)
-        if not match:
-            raise Exception("Unknown suffix in file")
-        suffix = match.group(1).lower()
-        col_suffix = COLUMN_MAP[suffix]
-        col_prefix = f"{mode}_{col_suffix}"
-        
-        for _, row in df.iterrows():
-            dataset_id = row.get('ID')
-            if pd.isna(dataset_id):
-                continue
+        refresh_summaries(coll, groups)
+        print(f"Refreshed {len(groups)} summary groups for {label}")
+    except Exception as e:
+        print(f"Summary refresh failed for {label}: {e}")
+    try:
+        print(f"Data generation of {label} is now {bump_generation(coll.database)}")
+    except Exception as e:
+        print(f"Generation bump failed for {label}: {e}")
 
-            if suffix == "size":
-                original = clean_float(row.get("O.Size"))
-                for col in df.columns:
-                    if col == 'ID' or col == 'O.Size' or pd.isna(row.get(col)):
-                        continue
-                    ctype = 'proposed' if col.startswith('P') else 'standard'
-                    raw_name = col[2:]  # remove P- or S-
-                    compressor = normalize_compressor(raw_name)
-                    if not compressor:
-                        continue
-                    inserted_compressors.add(compressor)
-                    doc = {
-                        "dataset_id": dataset_id,
-                        "compressor": compressor,
-                        "compressor_type": ctype,
-                        "dataset_type": "dna",
-                        "original_size": original,
-                        "compressed_size": clean_float(row.get(col))
-                    }
-                    try:
-                        upsert_document(doc, coll)
-                    except Exception as err:
-                        print(f"Error in {filename} | {dataset_id} | {compressor} → {err}")
-                        continue
-            else:
-                for col in df.columns:
-                    if col == 'ID' or pd.isna(row.get(col)):
-                        continue
-                    ctype = 'proposed' if col.startswith('P') else 'standard'
-                    raw_name = col[2:]
-                    compressor = normalize_compressor(raw_name)
-                    if not compressor:
-                        continue
-                    inserted_compressors.add(compressor)
-                    doc = {
-                        "dataset_id": dataset_id,
-                        "compressor": compressor,
-                        "compressor_type": ctype,
-                        "dataset_type": "dna"
-                    }
-                    doc[col_prefix] = clean_float(row.get(col))
-                    try:
-                        upsert_document(doc, coll)
-                    except Exception as err:
-                        print(f"Error in {filename} | {dataset_id} | {compressor} → {err}")
-                        continue
-        print(f"Processed: {filename}")
+def new_stats():
+    return {"inserted": 0, "modified": 0, "deleted": 0, "failed": 0}
+
+class BulkUpserter:
+    """
+    Collect upserts as UpdateOne operations and send them to the collection
+    in unordered bulk_write batches of `batch_size` operations.
+    """
+    def __init__(self, coll, batch_size=BULK_BATCH_SIZE, label=""):
+        self.coll = coll
+        self.batch_size = max(1, int(batch_size))
+        self.label = label
+        self.ops = []
+        self.stats = new_stats()
+        self.round_trips = 0
+
+    def add(self, doc):
+        mark_touched(self.coll, doc)
+        self.ops.append(UpdateOne(document_filter(doc), {"$set": doc}, upsert=True))
+        if len(self.ops) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self.ops:
+            return
+        ops, self.ops = self.ops, []
+        self.round_trips += 1
+        try:
+            result = self.coll.bulk_write(ops, ordered=False)
+            self.stats["inserted"] += result.upserted_count
+            self.stats["modified"] += result.modified_count
+        except BulkWriteError as err:
+            details = err.details
+            self.stats["inserted"] += details.get("nUpserted", 0)
+            self.stats["modified"] += details.get("nModified", 0)
+            self.stats["failed"] += len(details.get("writeErrors", []))
+            for write_error in details.get("writeErrors", [])[:5]:
+                print(f"Error in {self.label} | op {write_error.get('index')} → {write_error.get('errmsg')}")
+        except Exception as err:
+            self.stats["failed"] += len(ops)
+            print(f"Bulk write failed in {self.label} ({len(ops)} ops) → {err}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.flush()
+        return False
+
+def iter_file_documents(source):
+    """Yield one partial result document per (dataset, compressor column) cell of a metric CSV."""
+    yield from frame_to_documents(read_metric_frame(source))
+
+def process_file(source, coll, bulk=False, batch_size=BULK_BATCH_SIZE):
+    """
+    Upsert every cell of a metric CSV (path or CsvSource) into `coll`.
+    With bulk=True the upserts are sent as unordered bulk_write batches instead of
+    one update_one round trip per cell. Returns the inserted/modified/failed counts.
+    """
+    source = as_source(source)
+    filename = source.name
+    stats = new_stats()
+    try:
+        if bulk:
+            with BulkUpserter(coll, batch_size, label=filename) as writer:
+                for doc in iter_file_documents(source):
+                    writer.add(doc)
+            stats = writer.stats
+        else:
+            for doc in iter_file_documents(source):
+                try:
+                    mark_touched(coll, doc)
+                    result = upsert_document(doc, coll)
+                    if result.upserted_id is not None:
+                        stats["inserted"] += 1
+                    else:
+                        stats["modified"] += result.modified_count
+                except Exception as err:
+                    stats["failed"] += 1
+                    print(f"Error in {filename} | {doc['dataset_id']} | {doc['compressor']} → {err}")
+                    continue
+        print(f"Processed: {filename} (inserted={stats['inserted']}, "
+              f"modified={stats['modified']}, failed={stats['failed']})")
     except Exception as e:
         skipped_files.append((filename, str(e)))
         print(f"Skipped {filename}: {e}")
+    return stats
 
-def process_all_files():
-    # Walk through BASE_DATA_FOLDER structure:
-    # BASE_DATA_FOLDER/{db_name}/{collection_name}/...
-    for db_name in os.listdir(BASE_DATA_FOLDER):
-        db_path = os.path.join(BASE_DATA_FOLDER, db_name)
-        if not os.path.isdir(db_path):
-            continue
-        for collection_name in os.listdir(db_path):
-            coll_path = os.path.join(db_path, collection_name)
-            if not os.path.isdir(coll_path):
-                continue
-            # Normalize db_name for printing as well.
-            norm_db_name = normalize_db_name(db_name)
-            print(f"Processing Database: '{norm_db_name}', Collection: '{collection_name}'")
-            client, coll = get_collection(db_name, collection_name)
-            try:
-                files = [os.path.join(coll_path, file) for file in os.listdir(coll_path) if file.endswith(".csv")]
-                for file in files:
-                    process_file(file, coll)
-            finally:
-                client.close()
+def process_file_streaming(source, coll, chunk_size=STREAM_CHUNK_ROWS, batch_size=BULK_BATCH_SIZE):
+    """
+    Ingest a (possibly very large) metric CSV in fixed-size chunks: each chunk is
+    reshaped and written as bulk_write batches before the next one is read, so peak
+    memory stays bounded by the chunk size. Progress and rows/s are printed per chunk.
+    """
+    source = as_source(source)
+    filename = source.name
+    stats = new_stats()
+    rows = 0
+    started = time.perf_counter()
+    try:
+        with BulkUpserter(coll, batch_size, label=filename) as writer:
+            for chunk_rows, frame in iter_metric_chunks(source, chunk_size):
+                for doc in frame_to_documents(frame):
+                    writer.add(doc)
+                writer.flush()
+                rows += chunk_rows
+                elapsed = time.perf_counter() - started
+                print(f"  {filename}: {rows} rows, {len(frame)} documents in last chunk, "
+                      f"{rows / elapsed if elapsed else 0:.0f} rows/s")
+        stats = writer.stats
+        elapsed = time.perf_counter() - started
+        print(f"Processed: {filename} ({rows} rows in {elapsed:.2f}s, inserted={stats['inserted']}, "
+              f"modified={stats['modified']}, failed={stats['failed']})")
+    except Exception as e:
+        skipped_files.append((filename, str(e)))
+        print(f"Skipped {filename}: {e}")
+    return stats
+
+def skip_file(filename, error):
+    skipped_files.append((filename, str(error)))
+    print(f"Skipped {filename}: {error}")
+
+def write_corpus_frame(frame, coll, batch_size=BULK_BATCH_SIZE, label="", file_count=0):
+    """Write a merged corpus frame, one fully populated document per key."""
+    with BulkUpserter(coll, batch_size, label=label) as writer:
+        for doc in frame_to_documents(frame):
+            writer.add(doc)
+    stats = writer.stats
+    print(f"Processed {file_count} files into {len(frame)} documents for {label} "
+          f"(inserted={stats['inserted']}, modified={stats['modified']}, failed={stats['failed']})")
+    return stats
+
+def process_corpus(sources, coll, batch_size=BULK_BATCH_SIZE, label=""):
+    """
+    Reshape all metric CSVs of one collection together and write each
+    (dataset_id, compressor, compressor_type) document once, fully populated,
+    through unordered bulk_write batches. Returns the inserted/modified/failed counts.
+    """
+    frame = read_corpus_frame(sources, on_error=skip_file)
+    return write_corpus_frame(frame, coll, batch_size=batch_size, label=label, file_count=len(sources))
+
+def remove_rows(coll, row_keys, fields, batch_size=BULK_BATCH_SIZE, label=""):
+    """
+    Take the rows a metric CSV no longer has out of the collection: the file's fields
+    are unset on their documents, and documents left without any metric field (no
+    other file contributes to them) are deleted. Returns the deleted/modified/failed counts.
+    """
+    stats = new_stats()
+    metric_fields = [field for field, dtype in RESULT_FIELD_TYPES.items() if dtype == "float64"]
+    row_keys = list(row_keys)
+    for start in range(0, len(row_keys), max(1, int(batch_size))):
+        filters = [split_row_key(row_key) for row_key in row_keys[start:start + batch_size]]
+        for key_filter in filters:
+            mark_touched(coll, key_filter)
+        ops = [UpdateOne(key_filter, {"$unset": {field: "" for field in fields}}) for key_filter in filters]
+        ops.append(DeleteMany({"$or": filters, **{field: {"$exists": False} for field in metric_fields}}))
+        try:
+            result = coll.bulk_write(ops, ordered=True)
+            stats["modified"] += result.modified_count
+            stats["deleted"] += result.deleted_count
+        except Exception as err:
+            stats["failed"] += len(filters)
+            print(f"Removing {len(filters)} rows failed in {label} → {err}")
+    return stats
+
+def process_file_incremental(source, coll, manifest, batch_size=BULK_BATCH_SIZE):
+    """
+    Ingest only what changed in a metric CSV since the last recorded run: unchanged
+    files are skipped by content hash, for changed files only rows whose fingerprint
+    differs from the manifest are upserted, and rows recorded in the manifest that
+    are gone from the file are removed (see remove_rows). The manifest entry is
+    updated once every write of the file succeeded.
+    """
+    source = as_source(source)
+    filename = source.name
+    stats = new_stats()
+    try:
+        frame = None
+        if source.reopenable:
+            with source.open() as fh:
+                digest = stream_digest(fh)
+        else:
+            # A streamed tar member can only be read once: hash it while it is parsed.
+            reader, hashed = digest_source(source)
+            frame = read_metric_frame(hashed)
+            digest = reader.hexdigest()
+        if manifest.is_unchanged(source.key, digest):
+            print(f"Unchanged: {filename}")
+            return stats
+        if frame is None:
+            frame = read_metric_frame(source)
+        fingerprints = row_fingerprints(frame)
+        changed = frame[manifest.changed_rows(source.key, frame, fingerprints)]
+        with BulkUpserter(coll, batch_size, label=filename) as writer:
+            for doc in frame_to_documents(changed):
+                writer.add(doc)
+        stats = writer.stats
+        removed = manifest.removed_rows(source.key, fingerprints)
+        if removed:
+            add_stats(stats, remove_rows(coll, removed, manifest.recorded_fields(source.key), batch_size, filename))
+        if stats["failed"] == 0:
+            manifest.record(source.key, digest, frame, fingerprints)
+        print(f"Processed: {filename} ({len(changed)}/{len(frame)} rows changed, {len(removed)} removed, "
+              f"inserted={stats['inserted']}, modified={stats['modified']}, deleted={stats['deleted']}, "
+              f"failed={stats['failed']})")
+    except Exception as e:
+        skipped_files.append((filename, str(e)))
+        print(f"Skipped {filename}: {e}")
+    return stats
+
+def add_stats(total, stats):
+    for name in total:
+        total[name] += stats.get(name, 0)
+    return total
+
+def ingest_collection(db_name, collection_name, sources, bulk=False, batch_size=BULK_BATCH_SIZE,
+                      merge=False, stream=False, chunk_size=STREAM_CHUNK_ROWS, manifest=None, refresh=True):
+    """
+    Ingest the given CSV sources of one db.collection and return the summed counts.
+    With refresh=False the touched summary groups are left for the caller to refresh
+    (see refresh_touched_summaries), once the other sources of the collection are in.
+    """
+    norm_db_name = normalize_db_name(db_name)
+    print(f"Processing Database: '{norm_db_name}', Collection: '{collection_name}'")
+    coll = get_collection(db_name, collection_name)
+    total = new_stats()
+    if manifest is not None:
+        for source in sources:
+            add_stats(total, process_file_incremental(source, coll, manifest, batch_size=batch_size))
+    elif merge:
+        add_stats(total, process_corpus(sources, coll, batch_size=batch_size, label=f"{norm_db_name}.{collection_name}"))
+    elif stream:
+        for source in sources:
+            add_stats(total, process_file_streaming(source, coll, chunk_size=chunk_size, batch_size=batch_size))
+    else:
+        for source in sources:
+            add_stats(total, process_file(source, coll, bulk=bulk, batch_size=batch_size))
+    if refresh:
+        refresh_touched_summaries(coll, f"{norm_db_name}.{collection_name}")
+    return total
+
+def ingest_tar_archive(archive_path, base_folder, options, manifest=None):
+    """
+    Ingest a tar drop (.tar, .tar.gz, .tar.zst, ...) by streaming its members in
+    archive order, without extracting them to disk. With merge, the members of each
+    collection are reshaped as they stream by and written once the archive is read.
+    """
+    print(f"Streaming archive: {archive_path}")
+    total = new_stats()
+    merged = {}
+    streamed = set()
+    try:
+        for db_name, collection_name, source in iter_tar_sources(archive_path, base_folder):
+            if options["merge"] and manifest is None:
+                try:
+                    merged.setdefault((db_name, collection_name), []).append(read_metric_frame(source))
+                except Exception as e:
+                    skip_file(source.name, e)
+            else:
+                add_stats(total, ingest_collection(db_name, collection_name, [source], manifest=manifest,
+                                                   refresh=False, **options))
+                streamed.add((db_name, collection_name))
+    except Exception as e:
+        skip_file(os.path.basename(archive_path), e)
+    for db_name, collection_name in streamed:
+        refresh_touched_summaries(get_collection(db_name, collection_name),
+                                  f"{normalize_db_name(db_name)}.{collection_name}")
+    for (db_name, collection_name), frames in merged.items():
+        label = f"{normalize_db_name(db_name)}.{collection_name}"
+        coll = get_collection(db_name, collection_name)
+        add_stats(total, write_corpus_frame(merge_metric_frames(frames), coll, batch_size=options["batch_size"],
+                                            label=label, file_count=len(frames)))
+        refresh_touched_summaries(coll, label)
+    return total
+
+def run_ingest_task(task):
+    """
+    Worker process entry point: ingest one unit of work (a collection, or a single
+    file of it) through this process's pooled client and hand the bookkeeping back
+    to the parent, which owns the summary and the manifest file. The summary groups
+    the task touched are returned too: the parent refreshes them once per collection.
+    """
+    db_name, collection_name, sources, options, manifest_entries = task
+    skipped_files.clear()
+    not_found_compressors.clear()
+    inserted_compressors.clear()
+    touched_groups.clear()
+    manifest = IngestManifest(None, files=manifest_entries) if manifest_entries is not None else None
+    stats = ingest_collection(db_name, collection_name, sources, manifest=manifest, refresh=False, **options)
+    return {
+        "touched": set().union(*touched_groups.values()),
+        "stats": stats,
+        "skipped": list(skipped_files),
+        "not_found": set(not_found_compressors),
+        "inserted": set(inserted_compressors),
+        "manifest": manifest.files if manifest is not None else None,
+    }
+
+def build_ingest_tasks(grouped, options, manifest, split=()):
+    """
+    Split the discovered sources into independent tasks: one per file for plain runs of
+    the collections in `split`, one per collection otherwise (files of a collection that
+    are merged or tracked in the manifest always go together).
+    """
+    tasks = []
+    for (db_name, collection_name), sources in grouped.items():
+        if manifest is not None:
+            entries = {s.key: manifest.files[s.key] for s in sources if s.key in manifest.files}
+            tasks.append((db_name, collection_name, sources, options, entries))
+        elif options["merge"] or (db_name, collection_name) not in split:
+            tasks.append((db_name, collection_name, sources, options, None))
+        else:
+            tasks.extend((db_name, collection_name, [source], options, None) for source in sources)
+    return tasks
+
+def process_all_files(bulk=False, batch_size=BULK_BATCH_SIZE, merge=False, incremental=False, full=False,
+                      workers=INGEST_WORKERS, stream=False, chunk_size=STREAM_CHUNK_ROWS, roots=None):
+    """
+    Ingest the whole Result_data tree (or the given data folders / archives). With
+    workers > 1, collections and files are processed concurrently by a pool of worker
+    processes, each reusing one pooled client. Tar archives are streamed by the parent.
+    """
+    manifest = None
+    if incremental:
+        manifest = IngestManifest(MANIFEST_PATH)
+        if full:
+            manifest.files = {}
+    options = {"bulk": bulk, "batch_size": batch_size, "merge": merge,
+               "stream": stream, "chunk_size": chunk_size}
+    total = new_stats()
+    grouped, tar_archives = discover_sources(roots or [BASE_DATA_FOLDER])
+
+    if workers <= 1:
+        for (db_name, collection_name), sources in grouped.items():
+            add_stats(total, ingest_collection(db_name, collection_name, sources, manifest=manifest, **options))
+            if manifest is not None:
+                manifest.save()
+    else:
+        # Files of one collection upsert the same keys from several processes at once,
+        # which only the unique natural key index keeps from inserting duplicates.
+        split = set()
+        if manifest is None and not merge:
+            for db_name, collection_name in grouped:
+                if ensure_natural_key_index(get_collection(db_name, collection_name)):
+                    split.add((db_name, collection_name))
+                else:
+                    print(f"Ingesting the files of {normalize_db_name(db_name)}.{collection_name} in one task")
+        tasks = build_ingest_tasks(grouped, options, manifest, split)
+        print(f"Ingesting {len(tasks)} tasks with {workers} workers")
+        # Tasks left per collection: its summaries are refreshed (and the data generation
+        # bumped) once, when the last of them is done.
+        remaining = {}
+        for task in tasks:
+            remaining[task[:2]] = remaining.get(task[:2], 0) + 1
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(run_ingest_task, task): task[:2] for task in tasks}
+            for future in as_completed(futures):
+                db_name, collection_name = futures[future]
+                coll = get_collection(db_name, collection_name)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    skipped_files.append(("<worker>", str(e)))
+                    print(f"Ingest task failed: {e}")
+                    result = None
+                remaining[(db_name, collection_name)] -= 1
+                if result is not None:
+                    for group in result["touched"]:
+                        mark_touched(coll, {"compressor": group[0], "compressor_type": group[1]})
+                if remaining[(db_name, collection_name)] == 0:
+                    refresh_touched_summaries(coll, f"{normalize_db_name(db_name)}.{collection_name}")
+                if result is None:
+                    continue
+                add_stats(total, result["stats"])
+                skipped_files.extend(result["skipped"])
+                not_found_compressors.update(result["not_found"])
+                inserted_compressors.update(result["inserted"])
+                if manifest is not None and result["manifest"] is not None:
+                    manifest.files.update(result["manifest"])
+                    manifest.dirty = True
+        if manifest is not None:
+            manifest.save()
+
+    for archive_path, base_folder in tar_archives:
+        add_stats(total, ingest_tar_archive(archive_path, base_folder, options, manifest))
+        if manifest is not None:
+            manifest.save()
+
+    print(f"\nTotal: inserted={total['inserted']}, modified={total['modified']}, deleted={total['deleted']}, "
+          f"failed={total['failed']}")
     if skipped_files:
         print("\nSkipped Files:")
         for name, reason in skipped_files:
@@ -202,11 +526,12 @@ def process_all_files():
         print("\nCompressors inserted:")
         for comp in sorted(inserted_compressors):
             print(f" - {comp}")
+    return total
 
-def export_to_csv():
+def export_to_csv(output_dir="."):
     """
     This export function will export documents for each db.collection combo
-    - It iterates over the BASE_DATA_FOLDER structure and exports the data
+    - It iterates over the BASE_DATA_FOLDER structure and streams the data
       in each collection to a CSV file named <db>_<collection>_export.csv.
     """
     for db_name in os.listdir(BASE_DATA_FOLDER):
@@ -219,21 +544,47 @@ def export_to_csv():
                 continue
             norm_db_name = normalize_db_name(db_name)
             print(f"Exporting data for Database: '{norm_db_name}', Collection: '{collection_name}'")
-            client, coll = get_collection(db_name, collection_name)
             try:
-                df = pd.DataFrame(list(coll.find()))
-                if df.empty:
+                coll = get_collection(db_name, collection_name)
+                if coll.estimated_document_count() == 0:
                     print("No data found to export.")
-                else:
-                    export_filename = f"{norm_db_name}_{collection_name}_export.csv"
-                    df.to_csv(export_filename, index=False)
-                    print(f"Exported {export_filename}")
+                    continue
+                export_filename = os.path.join(output_dir, f"{norm_db_name}_{collection_name}_export.csv")
+                with open(export_filename, "wb") as fh:
+                    for chunk in stream_export([(norm_db_name, coll)], "csv"):
+                        fh.write(chunk)
+                print(f"Exported {export_filename}")
             except Exception as e:
                 print(f"Export failed for {norm_db_name}.{collection_name}: {e}")
-            finally:
-                client.close()
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Load Result_data CSVs into MongoDB.")
+    parser.add_argument("--bulk", action="store_true",
+                        help="send upserts as unordered bulk_write batches")
+    parser.add_argument("--batch-size", type=int, default=BULK_BATCH_SIZE,
+                        help="operations per bulk_write batch (default: %(default)s)")
+    parser.add_argument("--merge", action="store_true",
+                        help="merge all metric CSVs of a collection and write one document per key")
+    parser.add_argument("--incremental", action="store_true",
+                        help="skip files and rows unchanged since the last run (see INGEST_MANIFEST_PATH)")
+    parser.add_argument("--full", action="store_true",
+                        help="with --incremental, ignore the manifest and rebuild it from scratch")
+    parser.add_argument("--stream", action="store_true",
+                        help="read each CSV in chunks and write them as they are reshaped (bounded memory)")
+    parser.add_argument("--chunk-size", type=int, default=STREAM_CHUNK_ROWS,
+                        help="rows per chunk with --stream (default: %(default)s)")
+    parser.add_argument("--source", action="append", dest="sources", metavar="PATH",
+                        help="data folder or .zip/.tar(.gz|.zst) archive to ingest instead of "
+                             "data/Result_data (repeatable)")
+    parser.add_argument("--workers", type=int, default=INGEST_WORKERS,
+                        help="worker processes ingesting collections/files concurrently (default: %(default)s)")
+    return parser.parse_args()
 
 if __name__ == "__main__":
+    args = parse_args()
     print("Starting data insertion process...")
-    process_all_files()
+    process_all_files(bulk=args.bulk, batch_size=args.batch_size, merge=args.merge,
+                      incremental=args.incremental, full=args.full, workers=args.workers,
+                      stream=args.stream, chunk_size=args.chunk_size, roots=args.sources)
     export_to_csv()
+    close_client()
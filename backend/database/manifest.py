@@ -0,0 +1,101 @@
+import os
+import json
+import hashlib
+import pandas as pd
+
+MANIFEST_VERSION = 1
+MANIFEST_FILENAME = ".ingest_manifest.json"
+
+def stream_digest(fh, block_size=1 << 20):
+    """Return the sha256 hex digest of a CSV's (decompressed) bytes, read block by block."""
+    digest = hashlib.sha256()
+    for block in iter(lambda: fh.read(block_size), b""):
+        digest.update(block)
+    return digest.hexdigest()
+
+def row_keys(frame):
+    """Return 'dataset_id|compressor|compressor_type' strings for a key-indexed frame."""
+    index = frame.index
+    return (index.get_level_values(0).astype(str) + "|" +
+            index.get_level_values(1).astype(str) + "|" +
+            index.get_level_values(2).astype(str))
+
+def row_fingerprints(frame):
+    """
+    Return {row key: fingerprint} for a key-indexed metric frame. The fingerprint is a
+    vectorized hash of the key and every field value of the row.
+    """
+    hashes = pd.util.hash_pandas_object(frame.reset_index(), index=False)
+    return dict(zip(row_keys(frame), (f"{h:016x}" for h in hashes.to_numpy())))
+
+def split_row_key(row_key):
+    """Return the (dataset_id, compressor, compressor_type) natural key filter of a row key."""
+    dataset_id, compressor, compressor_type = row_key.rsplit("|", 2)
+    return {"dataset_id": dataset_id, "compressor": compressor, "compressor_type": compressor_type}
+
+class IngestManifest:
+    """
+    Persisted record of what has already been ingested: per CSV file its content
+    hash, its fields and one fingerprint per (dataset_id, compressor, compressor_type) row.
+    """
+    def __init__(self, path, files=None):
+        self.path = path
+        self.files = dict(files) if files is not None else {}
+        self.dirty = False
+        if files is None and path and os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as fh:
+                    data = json.load(fh)
+                if data.get("version") == MANIFEST_VERSION:
+                    self.files = data.get("files", {})
+            except (OSError, ValueError) as e:
+                print(f"Ignoring unreadable manifest {path}: {e}")
+
+    def entry(self, key):
+        return self.files.get(key)
+
+    def is_unchanged(self, key, digest):
+        entry = self.files.get(key)
+        return entry is not None and entry.get("sha256") == digest
+
+    def changed_rows(self, key, frame, fingerprints):
+        """
+        Return a boolean mask over the frame rows that are new or differ from the
+        manifest. Every row counts as changed when the file's fields changed.
+        """
+        entry = self.files.get(key)
+        fields = sorted(frame.columns)
+        if entry is None or entry.get("fields") != fields:
+            return [True] * len(frame)
+        previous = entry.get("rows", {})
+        return [previous.get(row_key) != fp for row_key, fp in fingerprints.items()]
+
+    def removed_rows(self, key, fingerprints):
+        """Return the row keys recorded for the file that are no longer in it."""
+        entry = self.files.get(key)
+        if entry is None:
+            return []
+        return [row_key for row_key in entry.get("rows", {}) if row_key not in fingerprints]
+
+    def recorded_fields(self, key):
+        entry = self.files.get(key)
+        return entry.get("fields", []) if entry is not None else []
+
+    def record(self, key, digest, frame, fingerprints):
+        self.files[key] = {
+            "sha256": digest,
+            "fields": sorted(frame.columns),
+            "rows": fingerprints,
+        }
+        self.dirty = True
+
+    def save(self):
+        """Write the manifest atomically (temp file + rename)."""
+        if not self.dirty or not self.path:
+            return
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as fh:
+            json.dump({"version": MANIFEST_VERSION, "files": self.files}, fh)
+        os.replace(tmp_path, self.path)
+        self.dirty = False
@@ -11,26 +11,12 @@
 # class ResultComparison(Base):
 #     __table__ = Table("result_comparison", metadata, autoload_with=engine)
 
-import os
-from pymongo import MongoClient
-from dotenv import load_dotenv
-
-load_dotenv()
-
-# Get MongoDB connection details from environment variables.
-MONGODB_URI = os.getenv("MONGODB_URI", "mongodb://localhost:27017")
-
-# Create a MongoDB client.
-client = MongoClient(MONGODB_URI)
+from database.connection import get_client
 
 # Define the two database names.
 DB_DNA = "result_less_repetitive_dna_corpus_raw"
 DB_GENOMES = "result_less_repetitive_small_genomes_raw"
 
-# Get the "results" collection from each database.
-results_dna = client[DB_DNA]["results"]
-results_small_genomes = client[DB_GENOMES]["results"]
-
 # Optionally, you can provide simple helper classes or functions.
 class Result:
     """
@@ -43,10 +29,11 @@ class Result:
         Returns the results collection from the specified database.
         db: "dna" or "genomes"
         """
+        # Collections come from the process-wide pooled client.
         if db.lower() == "dna":
-            return results_dna
+            return get_client()[DB_DNA]["results"]
         elif db.lower() == "genomes":
-            return results_small_genomes
+            return get_client()[DB_GENOMES]["results"]
         else:
             raise ValueError("Invalid db value. Use 'dna' or 'genomes'.")
 
@@ -69,7 +56,7 @@ class Result:
 # # Example usage (if run as a script).
 # if __name__ == "__main__":
 #     # Print the count of documents in each collection.
-#     dna_count = results_dna.count_documents({})
-#     genomes_count = results_small_genomes.count_documents({})
+#     dna_count = Result.get_collection("dna").count_documents({})
+#     genomes_count = Result.get_collection("genomes").count_documents({})
 #     print(f"DNA corpus results count: {dna_count}")
 #     print(f"Small genomes results count: {genomes_count}")
\ No newline at end of file
@@ -0,0 +1,170 @@
+import re
+import pandas as pd
+from database.sources import as_source
+
+EXPECTED_COMPRESSORS = {"7-zip", "paq8px", "bsc",
+                        "gzip", "zstd", "bzip2", "zpaq", "cmix"}
+
+COLUMN_MAP = {
+    "cpu": "cpu_usage",
+    "time": "time",
+    "memory": "memory",
+    "size": "ratio"
+}
+
+# Natural key of a result document.
+KEY_FIELDS = ["dataset_id", "compressor", "compressor_type"]
+
+not_found_compressors = set()
+inserted_compressors = set()
+
+def clean_float(val):
+    try:
+        if pd.isna(val) or val == '':
+            return 0.0
+        return float(val)
+    except Exception:
+        return 0.0
+
+def normalize_compressor(name):
+    name = name.lower().replace("s-", "").replace("p-", "")
+    if name.startswith("paq8"):
+        return "paq8px"
+    for expected in EXPECTED_COMPRESSORS:
+        if expected.replace("-", "") in name.replace("-", ""):
+            return expected
+    not_found_compressors.add(name)
+    return None
+
+def parse_metric_filename(filename):
+    """
+    Return (suffix, field) for a metric CSV name such as C.Time.csv or D_CPU.csv,
+    e.g. ("time", "compression_time"). Raises if the metric is unknown.
+    """
+    mode = 'compression' if filename.startswith('C') else 'decompression'
+    match = re.search(r"(cpu|memory|time|size)", filename, re.IGNORECASE)
+    if not match:
+        raise Exception("Unknown suffix in file")
+    suffix = match.group(1).lower()
+    return suffix, f"{mode}_{COLUMN_MAP[suffix]}"
+
+def parse_header(columns):
+    """
+    Map every compressor column of a wide metric CSV header (S-7-zip, P-paq8, ...)
+    to its (compressor, compressor_type). Columns with unknown compressors are left out.
+    """
+    parsed = {}
+    for col in columns:
+        if col == 'ID' or col == 'O.Size':
+            continue
+        compressor = normalize_compressor(col[2:])  # remove P- or S-
+        if not compressor:
+            continue
+        inserted_compressors.add(compressor)
+        parsed[col] = (compressor, 'proposed' if col.startswith('P') else 'standard')
+    return parsed
+
+def to_float_series(series):
+    """Vectorized clean_float: non-numeric and empty values become 0.0."""
+    return pd.to_numeric(series, errors="coerce").fillna(0.0).astype("float64")
+
+def melt_metric_frame(df, filename, header=None):
+    """
+    Reshape one wide metric CSV (one row per dataset, one column per compressor)
+    into a long frame indexed by (dataset_id, compressor, compressor_type) that holds
+    the metric field of the file (plus original_size for size files).
+    `header` is the parse_header result, when already known for the file.
+    Dataset ids are stripped here, once, so readers never normalize them again.
+    """
+    suffix, field = parse_metric_filename(filename)
+    if suffix == "size":
+        field = "compressed_size"
+    if header is None:
+        header = parse_header(df.columns)
+    df = df[df['ID'].notna()]
+    id_vars = ['ID'] + (['O.Size'] if suffix == "size" and 'O.Size' in df.columns else [])
+
+    long = df.melt(id_vars=id_vars, value_vars=list(header), var_name="column", value_name=field)
+    long = long[long[field].notna()]
+    compressors = {col: comp for col, (comp, _) in header.items()}
+    types = {col: ctype for col, (_, ctype) in header.items()}
+    frame = pd.DataFrame({
+        "dataset_id": long['ID'].astype(str).str.strip().to_numpy(),
+        "compressor": long["column"].map(compressors).to_numpy(),
+        "compressor_type": long["column"].map(types).to_numpy(),
+        field: to_float_series(long[field]).to_numpy(),
+    })
+    if suffix == "size":
+        frame["original_size"] = to_float_series(long['O.Size']).to_numpy() if 'O.Size' in long else 0.0
+    # A repeated dataset row overwrites the earlier one, as sequential upserts would.
+    frame = frame.drop_duplicates(subset=KEY_FIELDS, keep="last")
+    return frame.set_index(KEY_FIELDS)
+
+def read_metric_frame(source):
+    """Read one metric CSV (path or CsvSource) and return its long frame (see melt_metric_frame)."""
+    source = as_source(source)
+    with source.open() as fh:
+        return melt_metric_frame(pd.read_csv(fh), source.name)
+
+def iter_metric_chunks(source, chunk_size):
+    """
+    Read a metric CSV (path or CsvSource) in chunks of `chunk_size` rows and yield
+    (rows read, long frame) per chunk, so memory use depends on the chunk size rather
+    than the file size. The header is parsed once for the whole file.
+    """
+    source = as_source(source)
+    parse_metric_filename(source.name)  # fail early on unknown metric files
+    header = None
+    with source.open() as fh:
+        for chunk in pd.read_csv(fh, chunksize=chunk_size):
+            if header is None:
+                header = parse_header(chunk.columns)
+            yield len(chunk), melt_metric_frame(chunk, source.name, header=header)
+
+def merge_metric_frames(frames):
+    """
+    Outer-join long metric frames on the natural key so that every
+    (dataset_id, compressor, compressor_type) ends up in a single row with the
+    fields of all files. When two files carry the same field the later one wins.
+    """
+    merged = None
+    for frame in frames:
+        merged = frame if merged is None else frame.combine_first(merged)
+    if merged is None:
+        return pd.DataFrame(columns=KEY_FIELDS).set_index(KEY_FIELDS)
+    return merged
+
+def read_corpus_frame(sources, on_error=None):
+    """
+    Read every metric CSV of a corpus and merge them into one frame with one row per key.
+    Files that cannot be parsed are reported through on_error(filename, error) and skipped.
+    """
+    frames = []
+    for source in sources:
+        source = as_source(source)
+        try:
+            frames.append(read_metric_frame(source))
+        except Exception as e:
+            if on_error is None:
+                raise
+            on_error(source.name, e)
+    return merge_metric_frames(frames)
+
+def dataset_key(dataset_id):
+    """Normalized dataset id ("Total " -> "total") stored as dataset_key for indexed summary-row lookups."""
+    return str(dataset_id).strip().lower()
+
+def frame_to_documents(frame, dataset_type="dna"):
+    """
+    Turn a key-indexed frame into result documents. Fields missing for a key
+    (NaN after the outer join) are left out rather than written as NaN.
+    """
+    flat = frame.reset_index()
+    flat["dataset_key"] = flat["dataset_id"].astype(str).str.strip().str.lower()
+    records = flat.to_dict("records")
+    documents = []
+    for record in records:
+        doc = {k: v for k, v in record.items() if not (isinstance(v, float) and v != v)}
+        doc["dataset_type"] = dataset_type
+        documents.append(doc)
+    return documents
@@ -1,11 +1,13 @@
 import os
-from pymongo import MongoClient
+import argparse
+from pymongo import MongoClient, ASCENDING
 from dotenv import load_dotenv
+from database.db import normalize_db_name
 
 load_dotenv()
 MONGODB_URI = os.getenv("MONGODB_URI", "mongodb://localhost:27017")
 
-# Define the two database names.
+# Define the two database names (as in data/Result_data; the ingester writes to their short names).
 DATABASE_NAMES = [
     "result_less_repetitive_dna_corpus_raw",
     "result_less_repetitive_small_genomes_raw"
@@ -14,25 +16,109 @@ DATABASE_NAMES = [
 # Define the collection name that will be used in both databases.
 COLLECTION_NAME = "results"
 
-def reset_databases():
+# Natural key used by upserts and table lookups: (name, keys, options).
+NATURAL_KEY_INDEX = ("natural_key", [("dataset_id", ASCENDING), ("compressor", ASCENDING), ("compressor_type", ASCENDING)],
+                     {"unique": True})
+
+# Indexes of the results collections: (name, keys, options).
+RESULT_INDEXES = [
+    NATURAL_KEY_INDEX,
+    # Summary rows (Total / Peak / WACR) looked up by their normalized id.
+    ("summary_key", [("dataset_key", ASCENDING), ("compressor", ASCENDING), ("compressor_type", ASCENDING)],
+     {}),
+]
+
+# Query shapes the services run against the results collections; none may do a COLLSCAN.
+HOT_QUERIES = {
+    "upsert / table lookup": {"dataset_id": "BuEb", "compressor": "gzip", "compressor_type": "standard"},
+    "table lookup by dataset": {"dataset_id": {"$in": ["BuEb", "AgPh"]}},
+    "wacr rows": {"dataset_key": "wacr"},
+    "summary row": {"dataset_key": "total", "compressor": "gzip", "compressor_type": "proposed"},
+    "summary rows": {"dataset_key": {"$in": ["total", "peak", "wacr"]}},
+}
+
+def backfill_dataset_key(coll):
+    """Set dataset_key = lower(trim(dataset_id)) on documents ingested before the field existed."""
+    result = coll.update_many(
+        {"dataset_key": {"$exists": False}},
+        [{"$set": {"dataset_key": {"$toLower": {"$trim": {"input": {"$toString": "$dataset_id"}}}}}}],
+    )
+    return result.modified_count
+
+def ensure_indexes(coll):
+    """Create the results indexes (no-op for indexes that already exist)."""
+    created = []
+    for name, keys, options in RESULT_INDEXES:
+        created.append(coll.create_index(keys, name=name, **options))
+    return created
+
+def plan_stages(plan):
+    """Yield every stage name of an explain() plan tree."""
+    if not isinstance(plan, dict):
+        return
+    if "stage" in plan:
+        yield plan["stage"]
+    for key in ("inputStage", "queryPlan"):
+        if key in plan:
+            yield from plan_stages(plan[key])
+    for child in plan.get("inputStages", []):
+        yield from plan_stages(child)
+
+def verify_query_plans(coll):
+    """
+    Run explain() on every hot query shape and return {name: (stages, ok)};
+    a shape is ok when its winning plan uses an index and never scans the collection.
+    """
+    report = {}
+    for name, query in HOT_QUERIES.items():
+        explain = coll.find(query).explain()
+        winning_plan = explain.get("queryPlanner", {}).get("winningPlan", {})
+        stages = list(plan_stages(winning_plan))
+        ok = "COLLSCAN" not in stages and any(stage in ("IXSCAN", "EXPRESS_IXSCAN", "IDHACK") for stage in stages)
+        report[name] = (stages, ok)
+    return report
+
+def provision_database(db):
+    """Ensure the results collection, its indexes and dataset_key exist, then check the query plans."""
+    if COLLECTION_NAME not in db.list_collection_names():
+        db.create_collection(COLLECTION_NAME)
+        print(f"  Created collection '{COLLECTION_NAME}' in database '{db.name}'")
+    coll = db[COLLECTION_NAME]
+    backfilled = backfill_dataset_key(coll)
+    if backfilled:
+        print(f"  Backfilled dataset_key on {backfilled} documents")
+    for name in ensure_indexes(coll):
+        print(f"  Index ready: {name}")
+    all_ok = True
+    for name, (stages, ok) in verify_query_plans(coll).items():
+        all_ok = all_ok and ok
+        print(f"  {'OK ' if ok else 'BAD'} {name}: {' <- '.join(stages)}")
+    return all_ok
+
+def reset_databases(indexes_only=False):
+    """
+    Drop and recreate the 'results' collections (unless indexes_only), then provision
+    their indexes and verify that the hot query shapes use them.
+    """
+    client = None
+    all_ok = True
     try:
         client = MongoClient(MONGODB_URI)
 
         for db_name in DATABASE_NAMES:
-            db = client[db_name]
-            print(f"Processing database: {db_name}")
-            
-            # Drop the 'results' collection if it exists.
-            if COLLECTION_NAME in db.list_collection_names():
-                db.drop_collection(COLLECTION_NAME)
-                print(f"  Dropped collection '{COLLECTION_NAME}' from database '{db_name}'")
-            
-            # Create the 'results' collection.
-            db.create_collection(COLLECTION_NAME)
-            print(f"  Created collection '{COLLECTION_NAME}' in database '{db_name}'")
-            
+            db = client[normalize_db_name(db_name)]
+            print(f"Processing database: {db.name}")
+
+            if not indexes_only:
+                # Drop the 'results' collection if it exists.
+                if COLLECTION_NAME in db.list_collection_names():
+                    db.drop_collection(COLLECTION_NAME)
+                    print(f"  Dropped collection '{COLLECTION_NAME}' from database '{db.name}'")
+
+            all_ok = provision_database(db) and all_ok
+
             # Display collections in the current database.
-            print(f"  Collections in '{db_name}':")
+            print(f"  Collections in '{db.name}':")
             for coll in db.list_collection_names():
                 print("   -", coll)
                 sample_doc = db[coll].find_one()
@@ -40,11 +126,19 @@ def reset_databases():
                     print("      Sample document keys:", list(sample_doc.keys()))
                 else:
                     print("      Collection is empty!")
-                    
+
     except Exception as e:
         print(f"Error setting up databases: {e}")
+        all_ok = False
     finally:
-        client.close()
+        if client is not None:
+            client.close()
+    return all_ok
 
 if __name__ == "__main__":
-    reset_databases()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Reset the results collections and provision their indexes.")
+    parser.add_argument("--indexes-only", action="store_true",
+                        help="keep existing data; only create indexes, backfill dataset_key and verify query plans")
+    args = parser.parse_args()
+    if not reset_databases(indexes_only=args.indexes_only):
+        raise SystemExit(1)
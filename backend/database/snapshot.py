@@ -0,0 +1,71 @@
+"""
+Build local Parquet snapshots of the results collections straight from the
+benchmark CSVs under data/Result_data (no database involved), one file per
+corpus database: <output>/<db>.parquet. The parquet storage backend serves the
+API from these files. Run from the backend folder:
+    python -m database.snapshot [--source PATH] [-o DIR]
+"""
+import os
+import argparse
+from database.db import normalize_db_name
+from database.insert_data import BASE_DATA_FOLDER, PROJECT_ROOT
+from database.export import COLLECTION_NAME, KEY_FIELDS, RESULT_FIELDS
+from database.result_frames import dataset_key, merge_metric_frames, read_corpus_frame, read_metric_frame
+from database.sources import buffered_source, discover_sources, iter_tar_sources
+
+SNAPSHOT_DIR = os.getenv("PARQUET_SNAPSHOT_DIR", os.path.join(PROJECT_ROOT, "data", "snapshot"))
+SNAPSHOT_COLUMNS = KEY_FIELDS + ["dataset_key", "dataset_type"] + RESULT_FIELDS
+
+def snapshot_path(db_name, collection_name=COLLECTION_NAME, snapshot_dir=SNAPSHOT_DIR):
+    name = db_name if collection_name == COLLECTION_NAME else f"{db_name}.{collection_name}"
+    return os.path.join(snapshot_dir, f"{name}.parquet")
+
+def snapshot_frame(frame, dataset_type="dna"):
+    """Flatten a merged corpus frame into the snapshot columns (the fields of the result documents)."""
+    flat = frame.reset_index()
+    flat["dataset_key"] = flat["dataset_id"].map(dataset_key)
+    flat["dataset_type"] = dataset_type
+    for field in RESULT_FIELDS:
+        if field not in flat:
+            flat[field] = float("nan")
+    flat = flat[SNAPSHOT_COLUMNS]
+    for field in ["compressor", "compressor_type", "dataset_key", "dataset_type"]:
+        flat[field] = flat[field].astype("category")
+    return flat
+
+def write_snapshot(frame, path):
+    """Write atomically, so a serving process never reads a half-written file."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    frame.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, path)
+
+def build_snapshots(roots=None, snapshot_dir=SNAPSHOT_DIR):
+    """Build one snapshot per (db, collection) found under the roots; returns {path: rows}."""
+    grouped, tar_archives = discover_sources(roots or [BASE_DATA_FOLDER])
+    frames = {}
+    for (db_name, collection_name), sources in grouped.items():
+        frames.setdefault((db_name, collection_name), []).append(
+            read_corpus_frame(sources, on_error=lambda name, e: print(f"Skipped {name}: {e}")))
+    for archive_path, base_folder in tar_archives:
+        for db_name, collection_name, source in iter_tar_sources(archive_path, base_folder):
+            try:
+                frames.setdefault((db_name, collection_name), []).append(read_metric_frame(buffered_source(source)))
+            except Exception as e:
+                print(f"Skipped {source.name}: {e}")
+    written = {}
+    for (db_name, collection_name), parts in frames.items():
+        path = snapshot_path(normalize_db_name(db_name), collection_name, snapshot_dir)
+        frame = snapshot_frame(merge_metric_frames(parts))
+        write_snapshot(frame, path)
+        written[path] = len(frame)
+        print(f"Wrote {len(frame)} rows to {path}")
+    return written
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build Parquet snapshots of the results from data/Result_data.")
+    parser.add_argument("--source", action="append", dest="sources",
+                        help="data folder or archive (repeatable, default: data/Result_data)")
+    parser.add_argument("-o", "--output", default=SNAPSHOT_DIR, help="snapshot folder")
+    args = parser.parse_args()
+    build_snapshots(args.sources, args.output)
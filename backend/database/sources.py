@@ -0,0 +1,255 @@
+import os
+import io
+import hashlib
+import bz2
+import gzip
+import lzma
+import tarfile
+import zipfile
+from functools import partial
+
+# Single-file compression wrappers, by file suffix.
+COMPRESSED_SUFFIXES = (".gz", ".bz2", ".xz", ".zst")
+ZIP_SUFFIXES = (".zip",)
+TAR_SUFFIXES = (".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tar.xz", ".tar.zst", ".tzst")
+
+def open_zstd(fileobj):
+    """Wrap a binary stream in a zstd decompressing reader (needs the zstandard package)."""
+    try:
+        import zstandard
+    except ImportError as e:
+        raise RuntimeError("Reading .zst files requires the 'zstandard' package (pip install zstandard)") from e
+    return zstandard.ZstdDecompressor().stream_reader(fileobj, closefd=True)
+
+def decompress_stream(name, fileobj):
+    """Return a stream of the decompressed bytes of `fileobj`, chosen by the suffix of `name`."""
+    lower = name.lower()
+    if lower.endswith(".gz"):
+        return gzip.GzipFile(fileobj=fileobj, mode="rb")
+    if lower.endswith(".bz2"):
+        return bz2.BZ2File(fileobj, mode="rb")
+    if lower.endswith(".xz"):
+        return lzma.LZMAFile(fileobj, mode="rb")
+    if lower.endswith(".zst"):
+        return open_zstd(fileobj)
+    return fileobj
+
+def csv_name(name):
+    """C.Time.csv.gz -> C.Time.csv"""
+    base = os.path.basename(name)
+    for suffix in COMPRESSED_SUFFIXES:
+        if base.lower().endswith(".csv" + suffix):
+            return base[:-len(suffix)]
+    return base
+
+def is_metric_csv(name):
+    lower = os.path.basename(name).lower()
+    return lower.endswith(".csv") or any(lower.endswith(".csv" + s) for s in COMPRESSED_SUFFIXES)
+
+def is_archive(name):
+    lower = name.lower()
+    return lower.endswith(ZIP_SUFFIXES) or lower.endswith(TAR_SUFFIXES)
+
+def split_member_path(member_name):
+    """
+    Return (db_name, collection_name) for an archive member laid out like
+    [.../]<db>/<collection>/<file>.csv[.gz], or None for anything else.
+    """
+    parts = [p for p in member_name.replace("\\", "/").split("/") if p and p != "."]
+    if len(parts) < 3 or not is_metric_csv(parts[-1]):
+        return None
+    return parts[-3], parts[-2]
+
+def open_path(path):
+    lower = path.lower()
+    if lower.endswith(".gz"):
+        return gzip.open(path, "rb")
+    if lower.endswith(".bz2"):
+        return bz2.open(path, "rb")
+    if lower.endswith(".xz"):
+        return lzma.open(path, "rb")
+    if lower.endswith(".zst"):
+        return open_zstd(open(path, "rb"))
+    return open(path, "rb")
+
+def open_zip_member(archive_path, member_name):
+    # The member stream stays readable after the archive handle is closed.
+    with zipfile.ZipFile(archive_path) as archive:
+        member = archive.open(member_name)
+    return decompress_stream(member_name, member)
+
+class ForwardOnlyReader(io.RawIOBase):
+    """Expose a forward-only stream (a tar member read in stream mode) as a regular binary file."""
+    def __init__(self, fileobj):
+        self.fileobj = fileobj
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return False
+
+    def readinto(self, buffer):
+        data = self.fileobj.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+class DigestReader(io.RawIOBase):
+    """Pass a binary stream through, computing the sha256 of everything read from it."""
+    def __init__(self, fileobj):
+        self.fileobj = fileobj
+        self.digest = hashlib.sha256()
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = self.fileobj.read(len(buffer))
+        buffer[:len(data)] = data
+        self.digest.update(data)
+        return len(data)
+
+    def close(self):
+        if not self.closed:
+            # Hash what the consumer left unread, so the digest covers the whole stream.
+            for block in iter(lambda: self.fileobj.read(1 << 20), b""):
+                self.digest.update(block)
+            self.fileobj.close()
+        super().close()
+
+    def hexdigest(self):
+        return self.digest.hexdigest()
+
+def open_tar_member(member_name, fileobj):
+    return decompress_stream(member_name, io.BufferedReader(ForwardOnlyReader(fileobj)))
+
+class CsvSource:
+    """
+    A metric CSV to ingest: a plain or compressed file, or a member of an archive.
+    `key` identifies it in the manifest, `name` is the CSV file name (without a
+    compression suffix) and open() returns a binary stream of the CSV bytes. A source
+    that is not `reopenable` (a streamed tar member) can only be opened once.
+    """
+    def __init__(self, key, name, opener, reopenable=True):
+        self.key = key
+        self.name = name
+        self.opener = opener
+        self.reopenable = reopenable
+
+    def open(self):
+        return self.opener()
+
+    def read_bytes(self):
+        with self.open() as fh:
+            return fh.read()
+
+    def __repr__(self):
+        return f"CsvSource({self.key!r})"
+
+def file_source(path, base_folder=None):
+    key = os.path.relpath(path, base_folder) if base_folder else path
+    return CsvSource(key.replace(os.sep, "/"), csv_name(path), partial(open_path, path))
+
+def as_source(source):
+    """Accept either a CsvSource or a plain path."""
+    if isinstance(source, CsvSource):
+        return source
+    return file_source(source)
+
+def buffered_source(source, data=None):
+    """Read a (possibly single-use) source into memory so it can be opened again."""
+    if data is None:
+        data = source.read_bytes()
+    return CsvSource(source.key, source.name, partial(io.BytesIO, data))
+
+def digest_source(source):
+    """
+    Return (DigestReader, source reading through it): a single-use copy of `source` whose
+    sha256 is known once it has been read, for sources that cannot be opened twice.
+    """
+    reader = DigestReader(source.open())
+    return reader, CsvSource(source.key, source.name, partial(io.BufferedReader, reader), reopenable=False)
+
+def archive_key(archive_path, member_name, base_folder=None):
+    archive = os.path.relpath(archive_path, base_folder) if base_folder else archive_path
+    return f"{archive.replace(os.sep, '/')}:{member_name}"
+
+def iter_zip_sources(archive_path, base_folder=None):
+    """Yield (db_name, collection_name, CsvSource) for every metric CSV member of a zip archive."""
+    with zipfile.ZipFile(archive_path) as archive:
+        names = sorted(info.filename for info in archive.infolist() if not info.is_dir())
+    for member_name in names:
+        location = split_member_path(member_name)
+        if location is None:
+            continue
+        source = CsvSource(archive_key(archive_path, member_name, base_folder), csv_name(member_name),
+                           partial(open_zip_member, archive_path, member_name))
+        yield location[0], location[1], source
+
+def open_tar_stream(archive_path):
+    """Open a tar archive as a forward-only stream (works for zstd, which is not seekable)."""
+    lower = archive_path.lower()
+    if lower.endswith((".tar.zst", ".tzst")):
+        return tarfile.open(fileobj=open_zstd(open(archive_path, "rb")), mode="r|")
+    return tarfile.open(archive_path, mode="r|*")
+
+def iter_tar_sources(archive_path, base_folder=None):
+    """
+    Yield (db_name, collection_name, CsvSource) for every metric CSV member of a tar
+    archive, in archive order and without extracting anything to disk. The archive
+    is read as a stream, so each source can only be opened while it is the current
+    member (use buffered_source to keep one around).
+    """
+    with open_tar_stream(archive_path) as archive:
+        for member in archive:
+            if not member.isfile():
+                continue
+            location = split_member_path(member.name)
+            if location is None:
+                continue
+            fileobj = archive.extractfile(member)
+            source = CsvSource(archive_key(archive_path, member.name, base_folder), csv_name(member.name),
+                               partial(open_tar_member, member.name, fileobj), reopenable=False)
+            yield location[0], location[1], source
+
+def discover_sources(roots):
+    """
+    Apply the Result_data discovery rules to a list of roots (data folders or archives):
+    <root>/<db>/<collection>/*.csv[.gz|.bz2|.xz|.zst] files, zip archives laid out the
+    same way, and archives found at the top level of a data folder. Sources are keyed
+    relative to their root.
+    Returns ({(db_name, collection_name): [CsvSource]}, [(tar archive path, root)]); tar
+    archives can only be streamed, so they are returned for iter_tar_sources.
+    """
+    grouped = {}
+    tar_archives = []
+
+    def add_archive(path, base_folder):
+        if path.lower().endswith(ZIP_SUFFIXES):
+            for db_name, collection_name, source in iter_zip_sources(path, base_folder):
+                grouped.setdefault((db_name, collection_name), []).append(source)
+        else:
+            tar_archives.append((path, base_folder))
+
+    for root in roots:
+        if os.path.isfile(root):
+            if is_archive(root):
+                add_archive(root, os.path.dirname(root))
+            continue
+        if not os.path.isdir(root):
+            continue
+        for db_name in sorted(os.listdir(root)):
+            db_path = os.path.join(root, db_name)
+            if os.path.isfile(db_path) and is_archive(db_name):
+                add_archive(db_path, root)
+                continue
+            if not os.path.isdir(db_path):
+                continue
+            for collection_name in sorted(os.listdir(db_path)):
+                coll_path = os.path.join(db_path, collection_name)
+                if not os.path.isdir(coll_path):
+                    continue
+                sources = grouped.setdefault((db_name, collection_name), [])
+                sources.extend(file_source(os.path.join(coll_path, file), root)
+                               for file in sorted(os.listdir(coll_path)) if is_metric_csv(file))
+    return grouped, tar_archives
@@ -0,0 +1,144 @@
+"""
+Materialized per-(compressor, compressor_type) aggregates of a results collection.
+The ingester refreshes the groups it touched after every run, so charts can read a
+handful of summary documents instead of scanning the results. Rebuild everything with:
+    python -m database.summary
+"""
+from datetime import datetime, timezone
+import pandas as pd
+from database.connection import get_client
+
+SUMMARY_COLLECTION = "summary"
+# dataset_key values of the pre-aggregated rows shipped in the CSVs; they are not datasets.
+SUMMARY_ROW_KEYS = ["total", "peak", "wacr"]
+SUMMED_FIELDS = [
+    "compression_time",
+    "compression_memory",
+    "compression_cpu_usage",
+    "decompression_time",
+    "decompression_memory",
+    "decompression_cpu_usage",
+]
+SIZE_FIELDS = ["original_size", "compressed_size"]
+# Shipped rows whose values are kept next to the computed ones.
+REPORTED_ROW_KEYS = ["total", "peak"]
+
+def summary_id(compressor, compressor_type):
+    return f"{compressor}|{compressor_type}"
+
+def summary_pipeline(groups=None):
+    """
+    Aggregation pipeline computing, per (compressor, compressor_type) of the dataset rows:
+    dataset count, total_<field> and peak_<field> for every metric and size, and the
+    size-weighted WACR (sum of original sizes / sum of compressed sizes over the datasets
+    with a compressed size). The values of the Total / Peak rows shipped in the CSVs, when
+    present, are kept as reported_total_<field> / reported_peak_<field>. Results are
+    merged into the summary collection of the same database.
+    """
+    match = {"dataset_key": {"$ne": "wacr"}}
+    if groups:
+        match["$or"] = [{"compressor": c, "compressor_type": t} for c, t in sorted(groups)]
+    is_shipped = {"$in": ["$dataset_key", SUMMARY_ROW_KEYS]}
+    group = {
+        "_id": {"compressor": "$compressor", "compressor_type": "$compressor_type"},
+        "dataset_count": {"$sum": {"$cond": [is_shipped, 0, 1]}},
+    }
+    for field in SUMMED_FIELDS + SIZE_FIELDS:
+        group[f"total_{field}"] = {"$sum": {"$cond": [is_shipped, 0, f"${field}"]}}
+        group[f"peak_{field}"] = {"$max": {"$cond": [is_shipped, None, f"${field}"]}}
+    for field in SUMMED_FIELDS:
+        for row in REPORTED_ROW_KEYS:
+            group[f"reported_{row}_{field}"] = {
+                "$max": {"$cond": [{"$eq": ["$dataset_key", row]}, f"${field}", None]}}
+    # WACR only weighs the datasets the compressor actually ran on (compressed_size > 0).
+    ran = {"$gt": ["$compressed_size", 0]}
+    for field in SIZE_FIELDS:
+        group[f"wacr_{field}"] = {"$sum": {"$cond": [is_shipped, 0, {"$cond": [ran, f"${field}", 0]}]}}
+    return [
+        {"$match": match},
+        {"$group": group},
+        {"$set": {
+            "compressor": "$_id.compressor",
+            "compressor_type": "$_id.compressor_type",
+            "wacr": {"$cond": [
+                {"$gt": ["$wacr_compressed_size", 0]},
+                {"$divide": ["$wacr_original_size", "$wacr_compressed_size"]},
+                None,
+            ]},
+            "updated_at": datetime.now(timezone.utc),
+        }},
+        {"$set": {"_id": {"$concat": ["$compressor", "|", "$compressor_type"]}}},
+        {"$merge": {"into": SUMMARY_COLLECTION, "on": "_id", "whenMatched": "replace", "whenNotMatched": "insert"}},
+    ]
+
+def frame_summaries(frame):
+    """
+    In-memory equivalent of summary_pipeline over a frame of result rows (one column
+    per field); returns {(compressor, compressor_type): summary document}.
+    """
+    frame = frame[frame["dataset_key"] != "wacr"]
+    summaries = {}
+    for (compressor, compressor_type), group in frame.groupby(["compressor", "compressor_type"], observed=True):
+        rows = group[~group["dataset_key"].isin(SUMMARY_ROW_KEYS)]
+        doc = {
+            "_id": summary_id(compressor, compressor_type),
+            "compressor": compressor,
+            "compressor_type": compressor_type,
+            "dataset_count": len(rows),
+        }
+        for field in SUMMED_FIELDS + SIZE_FIELDS:
+            values = rows[field] if field in rows else pd.Series(dtype="float64")
+            doc[f"total_{field}"] = float(values.sum())
+            doc[f"peak_{field}"] = none_if_nan(values.max())
+        for field in SUMMED_FIELDS:
+            for row in REPORTED_ROW_KEYS:
+                reported = group.loc[group["dataset_key"] == row, field] if field in group else pd.Series(dtype="float64")
+                doc[f"reported_{row}_{field}"] = none_if_nan(reported.max())
+        ran = rows[rows["compressed_size"] > 0] if "compressed_size" in rows else rows.iloc[0:0]
+        for field in SIZE_FIELDS:
+            doc[f"wacr_{field}"] = float(ran[field].sum()) if field in ran else 0.0
+        doc["wacr"] = (doc["wacr_original_size"] / doc["wacr_compressed_size"]
+                       if doc["wacr_compressed_size"] > 0 else None)
+        summaries[(compressor, compressor_type)] = doc
+    return summaries
+
+def none_if_nan(value):
+    return None if pd.isna(value) else float(value)
+
+def refresh_summaries(coll, groups=None):
+    """
+    Recompute the summary documents of the given (compressor, compressor_type) groups
+    (all groups when None) from the results collection `coll`; the summaries of groups
+    left without result rows are deleted.
+    Returns the number of groups refreshed (None for a full rebuild).
+    """
+    if groups is not None and not groups:
+        return 0
+    list(coll.aggregate(summary_pipeline(groups)))
+    summary = coll.database[SUMMARY_COLLECTION]
+    checked = groups if groups is not None else [
+        (doc["compressor"], doc["compressor_type"]) for doc in summary.find({}, {"compressor": 1, "compressor_type": 1})]
+    empty = [summary_id(c, t) for c, t in checked
+             if coll.find_one({"compressor": c, "compressor_type": t, "dataset_key": {"$ne": "wacr"}}, {"_id": 1}) is None]
+    if empty:
+        summary.delete_many({"_id": {"$in": empty}})
+    return len(groups) if groups is not None else None
+
+def fetch_summaries(db, projection=None):
+    """Return {(compressor, compressor_type): summary document} for a corpus database."""
+    return {
+        (doc["compressor"], doc["compressor_type"]): doc
+        for doc in db[SUMMARY_COLLECTION].find({}, projection)
+    }
+
+async def fetch_summaries_async(db, projection=None):
+    """Async (Motor) version of fetch_summaries."""
+    docs = await db[SUMMARY_COLLECTION].find({}, projection).to_list(length=None)
+    return {(doc["compressor"], doc["compressor_type"]): doc for doc in docs}
+
+if __name__ == "__main__":
+    from database.export import CORPUS_DB_NAMES, COLLECTION_NAME
+    client = get_client()
+    for db_name in CORPUS_DB_NAMES.values():
+        refresh_summaries(client[db_name][COLLECTION_NAME])
+        print(f"Rebuilt summaries of {db_name}: {client[db_name][SUMMARY_COLLECTION].count_documents({})} groups")
@@ -1,13 +1,27 @@
+import asyncio
 import logging
-import json
-from fastapi import APIRouter, HTTPException
-from fastapi.responses import HTMLResponse
-from database.db import db_dna, db_small_genomes # now using MongoDB databases from db.py
+import orjson
+from typing import List, Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from pymongo import MongoClient
+from database.connection import get_pool_stats
+from database.db import get_mongo_client
+from services.storage import ResultStore, get_store_dna, get_store_small_genomes
+from database.export import EXPORT_FORMATS, corpus_collections, stream_export
 from utils import TableData, MetricsPlotData
-from services.table_results import TabularData
-from services.plot_to_json import PlotGenerator
-from services.scatter_to_json import ScatterPlotGenerator
-import plotly.graph_objects as go
+from services.table_results import AGGREGATE_ROW_IDS, TabularData, decode_cursor, encode_cursor
+from services.result_cache import result_cache
+from services.table_encoding import (
+    ARROW_STREAM_TYPE, COLUMNAR_JSON_TYPE, encode_arrow, encode_columnar, iter_arrow, negotiate_table_format,
+)
+from services.figure_cache import figure_cache
+from services.figure_writer import figure_writer
+from services.charts import CHART_FORMATS, bar_chart, scatter_chart, selection_bar_chart
+from services.metric_engine import NoDataError
+from services.plot_to_json import benchmark_db_name
+from services.scatter_to_json import scatter_metric_spec
+from services.warmup import chart_warmup
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -19,16 +33,14 @@ logger.addHandler(handler)
 
 router = APIRouter()
 
-# Instantiate plot generators
-plot_generator = PlotGenerator()
-scatterplot_generator = ScatterPlotGenerator()
-
-# Use the "results" collection from the DNA corpus database.
-results_collection_dna = db_dna["results"]
-results_collection_genome = db_small_genomes["results"]
+# Rows per /dashboard/data page when only a cursor is given, and the largest page allowed.
+DEFAULT_PAGE_SIZE = 500
+MAX_PAGE_SIZE = 10000
+# The table encoding depends on the Accept header.
+VARY_ACCEPT = {"Vary": "Accept"}
 
 @router.get("/dashboard/test")
-def test_api():
+async def test_api():
     """Endpoint to test API responsiveness."""
     try:
         return {"message": "API is working"}
@@ -36,31 +48,135 @@ def test_api():
         logger.error("Error in test_api", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/dashboard/pool")
+async def pool_stats():
+    """Connection pool counters of the shared MongoDB client, for sizing the pool under load."""
+    return get_pool_stats()
+
+@router.get("/dashboard/cache")
+async def cache_stats():
+    """Hit rate and memory use of the /dashboard/data result cache."""
+    return result_cache.stats()
+
 @router.post("/dashboard/data")
-def get_dashboard_data(data: TableData)->list:
+async def get_dashboard_data(
+    data: TableData,
+    stream: bool = False,
+    page_size: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    format: Optional[str] = None,
+    accept: Optional[str] = Header(None),
+    store_dna: ResultStore = Depends(get_store_dna),
+    store_genome: ResultStore = Depends(get_store_small_genomes),
+):
+    """
+    Table rows of both corpora, standard then proposed compressors per dataset.
+      - default: one JSON array;
+      - stream=true: NDJSON, one row per line, fetched and sent a chunk of datasets at a time;
+      - page_size / cursor: a page {"rows": [...], "next_cursor": token or null}; pass
+        next_cursor back with the same body for the next page (also resumes a stream).
+    format=columnar|arrow (or an Accept header of application/vnd.mgc.columnar+json or
+    application/vnd.apache.arrow.stream) sends the table column-oriented instead; Arrow
+    pages carry the next cursor in the X-Next-Cursor header.
+    """
     logger.info("[INFO] Fetching dashboard data...")
     logger.info(f"[INFO] Data: {data}")
     try:
-        result_dna = TabularData.fetch_grouped_results(results_collection_dna, data)
-        result_genome = TabularData.fetch_grouped_results(results_collection_genome, data)
+        table_format = negotiate_table_format(format, accept)
+        if stream and page_size is not None:
+            raise ValueError("stream and page_size cannot be combined")
+        if stream and table_format == "columnar":
+            raise ValueError("columnar JSON cannot be streamed; use NDJSON or Arrow")
+        if (stream or page_size is not None or cursor is not None) and data.aggregate:
+            raise ValueError("aggregate rows are only returned by unpaged, unstreamed requests")
+        if stream or page_size is not None or cursor is not None:
+            after = decode_cursor(cursor) if cursor else None
+            plan = TabularData.resume_plan([store_dna, store_genome], data, after)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    try:
+        if stream:
+            if table_format == "arrow":
+                return StreamingResponse(iter_arrow(plan_rows(plan), TabularData.columns(data)),
+                                         media_type=ARROW_STREAM_TYPE, headers=VARY_ACCEPT)
+            return StreamingResponse(ndjson_rows(plan), media_type="application/x-ndjson")
+        if page_size is not None or cursor is not None:
+            page = await data_page(plan, page_size or DEFAULT_PAGE_SIZE)
+            return table_response(page["rows"], data, table_format, page)
+
+        # Query both corpora concurrently.
+        result_dna, result_genome = await asyncio.gather(
+            TabularData.fetch_grouped_results_async(store_dna, data),
+            TabularData.fetch_grouped_results_async(store_genome, data),
+        )
         combined = result_dna + result_genome
+        if data.aggregate and not any(row["Dataset ID"] in AGGREGATE_ROW_IDS.values() for row in combined):
+            raise NoDataError("No data found for the selected datasets.")
 
         # Create a dict with a composite key
         # result_dict = {
         #     f"{item['Dataset ID']}_{item['Compressor']}_{item['Compressor Type']}": item
         #     for item in combined
         # }
-        return combined
+        return table_response(combined, data, table_format)
+    except NoDataError as e:
+        raise HTTPException(status_code=404, detail=str(e))
     except Exception as e:
         logger.error("Error in get_dashboard_data", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
+def table_response(rows, data: TableData, table_format, page=None):
+    """Encode a table (or a page of it) in the negotiated format."""
+    if table_format == "rows":
+        return page if page is not None else rows
+    extra = {"next_cursor": page["next_cursor"]} if page is not None else {}
+    if table_format == "columnar":
+        return Response(encode_columnar(rows, TabularData.columns(data), **extra),
+                        media_type=COLUMNAR_JSON_TYPE, headers=VARY_ACCEPT)
+    headers = dict(VARY_ACCEPT)
+    if extra.get("next_cursor"):
+        headers["X-Next-Cursor"] = extra["next_cursor"]
+    return Response(encode_arrow(rows, TabularData.columns(data)), media_type=ARROW_STREAM_TYPE, headers=headers)
+
+async def plan_rows(plan):
+    async for _, row in TabularData.iter_rows_async(plan):
+        yield row
+
+async def ndjson_rows(plan):
+    try:
+        async for row in plan_rows(plan):
+            yield orjson.dumps(row) + b"\n"
+    except Exception:
+        # The status line is already sent; log and end the stream.
+        logger.error("Error while streaming dashboard data", exc_info=True)
+
+async def data_page(plan, page_size):
+    """The first page_size rows of the plan and the cursor of the next page (keyset on the last row)."""
+    rows, last_db_name = [], None
+    async for db_name, row in TabularData.iter_rows_async(plan):
+        if len(rows) == page_size:
+            return {"rows": rows, "next_cursor": encode_cursor(last_db_name, rows[-1])}
+        rows.append(row)
+        last_db_name = db_name
+    return {"rows": rows, "next_cursor": None}
+
 @router.post("/dashboard/chart/barchart")
-def get_plot(metrics_plot_data: MetricsPlotData):
-    """Endpoint to generate a plot (barchart) based on the provided data name."""
+async def get_plot(
+    metrics_plot_data: MetricsPlotData,
+    format: str = "html",
+    if_none_match: Optional[str] = Header(None),
+):
+    """
+    Endpoint to generate a plot (barchart) based on the provided data name, as HTML
+    (default), figure JSON (format=json) or compact figure JSON (format=figure). Charts of
+    all the datasets are served from the figure cache with an ETag; charts of a dataset
+    selection are built every time.
+    """
     try:
         logger.info("[INFO] Generating plot...")
         logger.info(f"[INFO] Metrics plot data: {metrics_plot_data}")
+        if format not in CHART_FORMATS:
+            raise HTTPException(status_code=400, detail=f"Unsupported format: {format}")
         benchmark_type = metrics_plot_data.genomeType
         data_name = metrics_plot_data.name
         # Normalize CPU names.
@@ -70,25 +186,120 @@ def get_plot(metrics_plot_data: MetricsPlotData):
             data_name = "decompression_cpu_usage"
         
         logger.info(f"[INFO] Generating plot for benchmark type: {benchmark_type}, data name: {data_name}")
-        
-        json_data = plot_generator.generate_data_by_name(benchmark_type, data_name)
-        fig_dict = json.loads(json_data)
-        fig = go.Figure(fig_dict)
-        html_plot = fig.to_html(full_html=False, include_plotlyjs="cdn")
-        return HTMLResponse(content=html_plot)
+
+        if metrics_plot_data.datasets:
+            body, media_type = await selection_bar_chart(benchmark_type, data_name, metrics_plot_data.datasets, format)
+            return Response(body, media_type=media_type)
+        entry = await bar_chart(benchmark_type, data_name, format)
+        return chart_response(entry, if_none_match)
+    except HTTPException:
+        raise
+    except NoDataError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error("Error in get_plot (barchart)", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/dashboard/chart/scatterplot")
-def get_scatter_plot():
-    """Endpoint to generate a scatter plot based on the provided data."""
+async def get_scatter_plot(
+    format: str = "html",
+    if_none_match: Optional[str] = Header(None),
+    corpus: str = "dna_corpus",
+    x: str = "wacr",
+    y: str = "total compression time",
+):
+    """
+    Endpoint to generate the scatter plot of two metrics (x and y, see SCATTER_METRICS)
+    per compressor and type for a corpus (dna_corpus or dna); cached like the bar charts.
+    """
     try:
-        scatter_data = scatterplot_generator.generate_scatter_plot("data\\plot_metadata")
-        fig_dict = json.loads(scatter_data)
-        fig = go.Figure(fig_dict)
-        html_plot = fig.to_html(full_html=False, include_plotlyjs="cdn")
-        return HTMLResponse(content=html_plot)
+        if format not in CHART_FORMATS:
+            raise HTTPException(status_code=400, detail=f"Unsupported format: {format}")
+        try:
+            benchmark_db_name(corpus)
+            scatter_metric_spec(x)
+            scatter_metric_spec(y)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        entry = await scatter_chart(corpus, x, y, format)
+        return chart_response(entry, if_none_match)
+    except HTTPException:
+        raise
+    except NoDataError as e:
+        raise HTTPException(status_code=404, detail=str(e))
     except Exception as e:
         logger.error("Error in get_scatter_plot", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/dashboard/chart/barchart/figure")
+async def get_plot_figure(metrics_plot_data: MetricsPlotData, if_none_match: Optional[str] = Header(None)):
+    """
+    The bar chart as compact figure JSON for Plotly.react: numeric arrays as base64 typed
+    arrays (see services.figure_encoding).
+    """
+    return await get_plot(metrics_plot_data, "figure", if_none_match)
+
+@router.post("/dashboard/chart/scatterplot/figure")
+async def get_scatter_plot_figure(
+    if_none_match: Optional[str] = Header(None),
+    corpus: str = "dna_corpus",
+    x: str = "wacr",
+    y: str = "total compression time",
+):
+    """The scatter plot as compact figure JSON (see get_plot_figure)."""
+    return await get_scatter_plot("figure", if_none_match, corpus, x, y)
+
+@router.get("/dashboard/chart/cache")
+async def figure_cache_stats():
+    """Hit rate and memory use of the chart figure cache, and the figure JSON writes behind it."""
+    return dict(figure_cache.stats(), writer=figure_writer.stats())
+
+@router.get("/dashboard/ready")
+async def readiness():
+    """
+    Readiness of the chart warmup: 503 with the progress until a first warmup has built
+    every dashboard chart, then 200 (re-warms and failures are reported in the body).
+    """
+    status = chart_warmup.status()
+    if status["ready"]:
+        return status
+    return JSONResponse(status, status_code=503)
+
+def chart_response(entry, if_none_match: Optional[str]):
+    """The cached chart, or a 304 when the client's If-None-Match already holds its ETag."""
+    headers = {"ETag": entry.etag, "Cache-Control": "no-cache"}
+    if if_none_match:
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        if "*" in tags or entry.etag in tags:
+            return Response(status_code=304, headers=headers)
+    return Response(entry.body, media_type=entry.media_type, headers=headers)
+
+@router.get("/dashboard/export")
+def export_results(
+    format: str = "csv",
+    corpus: Optional[List[str]] = Query(None),
+    compressor: Optional[List[str]] = Query(None),
+    compressor_type: Optional[List[str]] = Query(None),
+    metric: Optional[List[str]] = Query(None),
+    client: MongoClient = Depends(get_mongo_client),
+):
+    """
+    Stream result documents as CSV, NDJSON or Parquet, optionally filtered by corpus/compressor/metric.
+    Kept synchronous: the encoders are sync generators that StreamingResponse drains in a worker thread.
+    Reads the MongoDB collections whatever the STORAGE_BACKEND.
+    """
+    logger.info(f"[INFO] Exporting results as {format} (corpus={corpus}, compressor={compressor}, metric={metric})")
+    try:
+        chunks = stream_export(corpus_collections(client, corpus), format, compressor, compressor_type, metric)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error("Error in export_results", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+    return StreamingResponse(
+        chunks,
+        media_type=EXPORT_FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="results_export.{format}"'},
+    )
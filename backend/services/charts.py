@@ -0,0 +1,116 @@
+"""
+Chart payloads of the chart endpoints: the figures of PlotGenerator /
+ScatterPlotGenerator rendered as HTML, figure JSON or compact figure JSON (see
+figure_encoding), cached in the figure cache per (corpus, normalized metric name,
+format). Shared by the routes and the warmup.
+"""
+import hashlib
+import logging
+import plotly.graph_objects as go
+from services.figure_cache import figure_cache
+from services.figure_encoding import compact_figure
+from services.plot_to_json import (
+    BENCHMARK_DB_NAMES, DATA_TO_METRIC_MAP, PLOT_METADATA_DIR, PlotGenerator, benchmark_db_name,
+    benchmark_metric_name, metric_spec,
+)
+from services.scatter_to_json import ScatterPlotGenerator, scatter_metric_spec
+from services.storage import get_result_store
+
+# Chart payload formats.
+CHART_FORMATS = {
+    "html": "text/html; charset=utf-8",
+    "json": "application/json",
+    "figure": "application/json",
+}
+
+# Instantiate plot generators
+plot_generator = PlotGenerator()
+
+def chart_div_id(*parts):
+    """HTML element id of a chart, derived from its cache key so the same chart renders the same bytes."""
+    return "chart-" + hashlib.sha1("|".join(map(str, parts)).encode("utf-8")).hexdigest()[:16]
+
+def render_chart(fig: go.Figure, chart_format: str, div_id: str = None):
+    """
+    (body, media type) of a figure rendered in a CHART_FORMATS format. HTML is rendered
+    into the element `div_id` (plotly picks a random one otherwise, which changes the ETag).
+    """
+    if chart_format not in CHART_FORMATS:
+        raise ValueError(f"Unsupported format: {chart_format}")
+    if chart_format == "figure":
+        body = compact_figure(fig)
+    elif chart_format == "json":
+        body = fig.to_json().encode("utf-8")
+    else:
+        body = fig.to_html(full_html=False, include_plotlyjs="cdn", div_id=div_id).encode("utf-8")
+    return body, CHART_FORMATS[chart_format]
+
+async def corpus_generation(db_name: str):
+    """Data generation of a corpus for the figure cache (None when it cannot be read)."""
+    try:
+        return await get_result_store(db_name).generation_async()
+    except Exception as e:
+        logging.warning(f"Could not read the data generation of {db_name}: {e}")
+        return None
+
+async def bar_chart(benchmark_type: str, data_name: str, chart_format: str = "html", refresh: bool = False):
+    """
+    FigureEntry of the bar chart of a metric over all the datasets of a corpus.
+    With refresh, wait for the entry of the current generation instead of serving a stale one.
+    """
+    if chart_format not in CHART_FORMATS:
+        raise ValueError(f"Unsupported format: {chart_format}")
+    db_name = benchmark_db_name(benchmark_type)
+    key, _, _ = metric_spec(benchmark_metric_name(data_name))
+
+    async def build():
+        fig = await plot_generator.figure_by_name_async(benchmark_type, data_name)
+        return render_chart(fig, chart_format, chart_div_id(db_name, key))
+
+    generation = await corpus_generation(db_name)
+    if refresh:
+        return await figure_cache.refresh((db_name, key, chart_format), generation, build)
+    return await figure_cache.get((db_name, key, chart_format), generation, build)
+
+async def selection_bar_chart(benchmark_type: str, data_name: str, datasets: list, chart_format: str = "html"):
+    """(body, media type) of the bar chart of a metric over a selection of datasets (not cached)."""
+    fig = await plot_generator.figure_by_name_async(benchmark_type, data_name, datasets)
+    key, _, _ = metric_spec(benchmark_metric_name(data_name))
+    return render_chart(fig, chart_format, chart_div_id(benchmark_db_name(benchmark_type), key, *datasets))
+
+async def scatter_chart(benchmark_type: str = "dna_corpus", x_metric: str = "wacr",
+                        y_metric: str = "total compression time", chart_format: str = "html", refresh: bool = False):
+    """FigureEntry of the scatter plot of two metrics of a corpus (see bar_chart)."""
+    if chart_format not in CHART_FORMATS:
+        raise ValueError(f"Unsupported format: {chart_format}")
+    db_name = benchmark_db_name(benchmark_type)
+    x_key, y_key = scatter_metric_spec(x_metric)[0], scatter_metric_spec(y_metric)[0]
+
+    async def build():
+        fig = await ScatterPlotGenerator(db_name).scatter_figure_async(PLOT_METADATA_DIR, x_key, y_key)
+        return render_chart(fig, chart_format, chart_div_id(db_name, "scatter", x_key, y_key))
+
+    key = (db_name, f"scatter {x_key} vs {y_key}", chart_format)
+    generation = await corpus_generation(db_name)
+    if refresh:
+        return await figure_cache.refresh(key, generation, build)
+    return await figure_cache.get(key, generation, build)
+
+def dashboard_charts(formats=("html",)):
+    """
+    [(name, async callable)] building every chart the dashboard loads: each
+    DATA_TO_METRIC_MAP metric and the default scatter plot of each corpus, in each format.
+    """
+    charts = []
+    for chart_format in formats:
+        for benchmark_type in BENCHMARK_DB_NAMES:
+            for data_name in DATA_TO_METRIC_MAP:
+                charts.append((f"{benchmark_type}/{data_name}.{chart_format}",
+                               lambda b=benchmark_type, d=data_name, f=chart_format: bar_chart(b, d, f, refresh=True)))
+            charts.append((f"{benchmark_type}/scatter.{chart_format}",
+                           lambda b=benchmark_type, f=chart_format: scatter_chart(b, chart_format=f, refresh=True)))
+    return charts
+
+def chart_corpora():
+    """Database names the dashboard charts are built from."""
+    return sorted(set(BENCHMARK_DB_NAMES.values()))
@@ -0,0 +1,128 @@
+"""
+In-memory LRU cache of rendered chart payloads (HTML or figure JSON), keyed by
+(corpus, normalized metric name, format) and tagged with the data generation of the
+corpus they were built from. Every entry carries a strong ETag (a hash of the payload)
+so browsers can revalidate with If-None-Match and get a 304.
+An entry whose generation is no longer current is still served while it is rebuilt
+in the background (stale-while-revalidate); only a missing entry is built in line.
+"""
+import os
+import time
+import asyncio
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+FIGURE_CACHE_SIZE = int(os.getenv("FIGURE_CACHE_SIZE", "64"))
+
+class FigureEntry:
+    def __init__(self, body: bytes, media_type: str, generation):
+        self.body = body
+        self.media_type = media_type
+        self.generation = generation
+        self.etag = '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+        self.built_at = time.time()
+
+class FigureCache:
+    """LRU of FigureEntry; `build` callables are awaited at most once at a time per key."""
+    def __init__(self, max_entries=FIGURE_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._building = {}  # key -> asyncio.Task of an in-line build or a background refresh
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.refresh_failures = 0
+
+    async def get(self, key, generation, build):
+        """
+        Return the FigureEntry of `key`. `build` is an async callable returning
+        (body bytes, media type); it runs when the entry is missing (awaited) or was
+        built from another generation (in the background, the stale entry is returned).
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                if generation is not None and entry.generation == generation:
+                    self.hits += 1
+                    return entry
+                self.stale_hits += 1
+            else:
+                self.misses += 1
+        if entry is not None:
+            self._start_build(key, generation, build, background=True)
+            return entry
+        entry = await self._start_build(key, generation, build)
+        if entry is None:
+            # Joined a background refresh that failed.
+            raise RuntimeError(f"Could not build figure {key}")
+        return entry
+
+    async def refresh(self, key, generation, build):
+        """
+        Return the FigureEntry of `key` built from `generation`, awaiting a build unless the
+        cached entry is already current (a build in flight for the key is joined).
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is not None and generation is not None and entry.generation == generation:
+            return entry
+        task = self._building.get(key)
+        if task is not None:
+            entry = await task
+            if entry is not None and entry.generation == generation:
+                return entry
+        entry = await self._start_build(key, generation, build)
+        if entry is None:
+            raise RuntimeError(f"Could not build figure {key}")
+        return entry
+
+    def _start_build(self, key, generation, build, background=False):
+        task = self._building.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._build(key, generation, build, background))
+            self._building[key] = task
+            task.add_done_callback(lambda _: self._building.pop(key, None))
+        return task
+
+    async def _build(self, key, generation, build, background):
+        try:
+            body, media_type = await build()
+        except Exception:
+            if not background:
+                raise
+            self.refresh_failures += 1
+            logging.exception(f"Background refresh of figure {key} failed; serving the stale entry")
+            return None
+        entry = FigureEntry(body, media_type, generation)
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.stale_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "memory_bytes": sum(len(entry.body) for entry in self._entries.values()),
+                "hits": self.hits,
+                "stale_hits": self.stale_hits,
+                "misses": self.misses,
+                "refreshing": len(self._building),
+                "refresh_failures": self.refresh_failures,
+                "hit_rate": round((self.hits + self.stale_hits) / lookups, 4) if lookups else 0.0,
+            }
+
+# Shared by the chart endpoints of this process.
+figure_cache = FigureCache()
@@ -0,0 +1,118 @@
+"""
+Write-behind persistence of the figure JSON files under data/plot_metadata (read by
+save_graphs.py and other offline tools). Chart requests only queue the JSON they
+built; one background thread writes the files. Queued writes to the same path are
+coalesced (the last JSON wins), every file is replaced atomically (temp file +
+rename) and a file whose content is unchanged is not rewritten.
+Persistence is opt-in with FIGURE_PERSIST=true.
+"""
+import os
+import atexit
+import logging
+import tempfile
+import threading
+
+FIGURE_PERSIST = os.getenv("FIGURE_PERSIST", "false").lower() in ("1", "true", "yes")
+
+def write_atomic(path: str, content: str) -> bool:
+    """Write content to path through a temp file and a rename; False when the file already holds it."""
+    data = content.encode("utf-8")
+    try:
+        with open(path, "rb") as f:
+            if f.read() == data:
+                return False
+    except FileNotFoundError:
+        pass
+    folder = os.path.dirname(path) or "."
+    os.makedirs(folder, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=folder, prefix=".tmp-", suffix=".json")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+    return True
+
+class FigureWriter:
+    """Queue of path -> JSON drained by a daemon thread started on the first write."""
+    def __init__(self, enabled=FIGURE_PERSIST):
+        self.enabled = enabled
+        self._cond = threading.Condition()
+        self._pending = {}
+        self._writing = 0
+        self._thread = None
+        self.queued = 0
+        self.coalesced = 0
+        self.written = 0
+        self.unchanged = 0
+        self.failed = 0
+
+    def submit(self, path: str, content) -> bool:
+        """
+        Queue content to be written to path: JSON text, or a figure serialized by the
+        writer thread. Returns False when persistence is disabled.
+        """
+        if not self.enabled:
+            return False
+        with self._cond:
+            if path in self._pending:
+                self.coalesced += 1
+            self._pending[path] = content
+            self.queued += 1
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="figure-writer", daemon=True)
+                self._thread.start()
+                atexit.register(self.flush)
+            self._cond.notify_all()
+        return True
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+                path = next(iter(self._pending))
+                content = self._pending.pop(path)
+                self._writing += 1
+            try:
+                if not isinstance(content, str):
+                    content = content.to_json()
+                if write_atomic(path, content):
+                    self.written += 1
+                    logging.info(f"Saved figure to {path}")
+                else:
+                    self.unchanged += 1
+            except Exception:
+                self.failed += 1
+                logging.exception(f"Could not save figure to {path}")
+            finally:
+                with self._cond:
+                    self._writing -= 1
+                    self._cond.notify_all()
+
+    def flush(self, timeout=None) -> bool:
+        """Wait until every queued figure is written; False on timeout."""
+        with self._cond:
+            return self._cond.wait_for(lambda: not self._pending and not self._writing, timeout)
+
+    def stats(self):
+        with self._cond:
+            return {
+                "enabled": self.enabled,
+                "pending": len(self._pending),
+                "queued": self.queued,
+                "coalesced": self.coalesced,
+                "written": self.written,
+                "unchanged": self.unchanged,
+                "failed": self.failed,
+            }
+
+# Shared by the plot generators of this process.
+figure_writer = FigureWriter()
@@ -0,0 +1,163 @@
+"""
+Vectorized metric engine shared by the table and chart code.
+Rows are grouped per (compressor, compressor_type) and every statistic of every
+requested field is computed in one NumPy pass over the rows sorted by group:
+  - total_<field>, peak_<field>, mean_<field> and count_<field> (NaN values skipped);
+  - weighted_<derived>: a derived metric over the whole selection, i.e. the ratio of
+    the summed inputs (WACR = sum of original sizes / sum of compressed sizes);
+  - dataset_count.
+Derived per-row metrics are computed from the stored fields: the compression ratio
+and the compression / decompression throughput in MB/s (sizes are stored in KB and
+times in seconds). Shipped Total / Peak / WACR rows and the datasets a compressor
+did not run on (compressed_size == 0) are left out of the aggregates.
+"""
+import numpy as np
+import pandas as pd
+from database.summary import SUMMARY_ROW_KEYS
+
+# Derived metric -> (numerator field, denominator field, scale).
+DERIVED_FIELDS = {
+    "compression_ratio": ("original_size", "compressed_size", 1.0),
+    "compression_throughput": ("original_size", "compression_time", 1 / 1024),
+    "decompression_throughput": ("original_size", "decompression_time", 1 / 1024),
+}
+AGGREGATE_STATS = ("total", "peak", "mean", "count")
+
+class NoDataError(ValueError):
+    """No result rows match the requested corpus, datasets or metric."""
+
+def source_fields(fields):
+    """The stored fields needed to compute `fields` (derived metrics are replaced by their inputs)."""
+    sources = []
+    for field in fields:
+        for source in DERIVED_FIELDS[field][:2] if field in DERIVED_FIELDS else (field,):
+            if source not in sources:
+                sources.append(source)
+    return sources
+
+def ratio(numerator, denominator, scale=1.0):
+    """Element-wise numerator / denominator * scale, NaN where the denominator is not positive."""
+    numerator = np.asarray(numerator, dtype="float64")
+    denominator = np.asarray(denominator, dtype="float64")
+    out = np.full(np.broadcast(numerator, denominator).shape, np.nan)
+    with np.errstate(invalid="ignore"):
+        np.divide(numerator, denominator, out=out, where=denominator > 0)
+    return out * scale
+
+def derive(columns):
+    """{field: float array} plus the derived metrics whose inputs are among the columns."""
+    derived = dict(columns)
+    for name, (numerator, denominator, scale) in DERIVED_FIELDS.items():
+        if numerator in columns and denominator in columns:
+            derived[name] = ratio(columns[numerator], columns[denominator], scale)
+    return derived
+
+def group_aggregates(codes, n_groups, columns, fields):
+    """
+    Aggregate float columns per group code (0 <= code < n_groups) in one pass.
+    Returns {name: array of n_groups} for the statistics listed in the module docstring;
+    groups without a value get NaN.
+    """
+    codes = np.asarray(codes, dtype="int64")
+    columns = derive(columns)
+    names = [field for field in fields if field in columns]
+    # Weighted metrics sum their inputs over the rows where both are set and the denominator is positive.
+    weighted = [field for field in names if field in DERIVED_FIELDS]
+    stacked = [columns[field] for field in names]
+    for field in weighted:
+        numerator, denominator, _ = DERIVED_FIELDS[field]
+        both = ~np.isnan(columns[field])
+        stacked += [np.where(both, columns[numerator], 0.0), np.where(both, columns[denominator], 0.0)]
+
+    out = {"dataset_count": np.zeros(n_groups)}
+    for field in names:
+        for stat in AGGREGATE_STATS:
+            out[f"{stat}_{field}"] = np.full(n_groups, np.nan)
+    for field in weighted:
+        out[f"weighted_{field}"] = np.full(n_groups, np.nan)
+    if not len(codes):
+        return out
+
+    order = np.argsort(codes, kind="stable")
+    groups, starts = np.unique(codes[order], return_index=True)
+    out["dataset_count"][groups] = np.diff(np.append(starts, len(codes)))
+    if not stacked:
+        return out
+    matrix = np.column_stack(stacked)[order]
+    valid = ~np.isnan(matrix)
+    totals = np.add.reduceat(np.where(valid, matrix, 0.0), starts, axis=0)
+    counts = np.add.reduceat(valid.astype("int64"), starts, axis=0)
+    peaks = np.fmax.reduceat(matrix, starts, axis=0)
+    for i, field in enumerate(names):
+        has_values = counts[:, i] > 0
+        out[f"total_{field}"][groups] = np.where(has_values, totals[:, i], np.nan)
+        out[f"peak_{field}"][groups] = peaks[:, i]
+        out[f"count_{field}"][groups] = counts[:, i]
+        out[f"mean_{field}"][groups] = ratio(totals[:, i], counts[:, i])
+    for j, field in enumerate(weighted):
+        column = len(names) + 2 * j
+        out[f"weighted_{field}"][groups] = ratio(totals[:, column], totals[:, column + 1], DERIVED_FIELDS[field][2])
+    return out
+
+def aggregate_columns(compressors, compressor_types, dataset_keys, columns, fields):
+    """
+    Aggregate per (compressor, compressor_type) the dataset rows given as parallel arrays.
+    Returns {(compressor, compressor_type): {name: value or None}} with lower-cased keys;
+    empty when no dataset row is left.
+    """
+    dataset_keys = np.asarray(dataset_keys, dtype=object)
+    rows = ~np.isin(dataset_keys, SUMMARY_ROW_KEYS)
+    if "compressed_size" in columns:
+        rows &= ~(np.asarray(columns["compressed_size"], dtype="float64") == 0)
+    if not rows.any():
+        return {}
+    codes, groups = pd.MultiIndex.from_arrays(
+        [np.asarray(compressors, dtype=object)[rows], np.asarray(compressor_types, dtype=object)[rows]]
+    ).factorize()
+    stats = group_aggregates(codes, len(groups), {
+        field: np.asarray(values, dtype="float64")[rows] for field, values in columns.items()
+    }, fields)
+    return {
+        (str(comp).strip().lower(), str(ctype).strip().lower()): {
+            name: None if np.isnan(values[i]) else float(values[i]) for name, values in stats.items()
+        }
+        for i, (comp, ctype) in enumerate(groups)
+    }
+
+def aggregate_frame(frame, fields, dataset_keys=None):
+    """
+    Aggregate a frame of result rows (see database.frames), optionally restricted to the
+    datasets whose dataset_key is in dataset_keys.
+    """
+    if dataset_keys is not None:
+        frame = frame[frame["dataset_key"].isin(list(dataset_keys))]
+    columns = {field: frame[field].to_numpy(dtype="float64", na_value=np.nan)
+               for field in source_fields(fields) if field in frame}
+    return aggregate_columns(frame["compressor"].to_numpy(dtype=object), frame["compressor_type"].to_numpy(dtype=object),
+                             frame["dataset_key"].to_numpy(dtype=object), columns, fields)
+
+def aggregate_records(records, fields):
+    """Aggregate result documents (dicts with dataset_id, compressor, compressor_type and the fields)."""
+    columns = {field: np.array([record.get(field) for record in records], dtype="float64")
+               for field in source_fields(fields)}
+    return aggregate_columns([record["compressor"] for record in records],
+                             [record["compressor_type"] for record in records],
+                             [str(record["dataset_id"]).strip().lower() for record in records],
+                             columns, fields)
+
+def with_derived(records, fields):
+    """
+    Copies of the result documents with the derived metrics among `fields` computed per
+    row (None when undefined, and on the shipped Total / Peak / WACR rows).
+    """
+    derived = [field for field in fields if field in DERIVED_FIELDS]
+    if not derived or not records:
+        return records
+    shipped = np.isin([str(record.get("dataset_id")).strip().lower() for record in records], SUMMARY_ROW_KEYS)
+    columns = derive({field: np.where(shipped, np.nan, np.array([record.get(field) for record in records], dtype="float64"))
+                      for field in source_fields(derived)})
+    return [
+        dict(record, **{field: None if np.isnan(columns[field][i]) else float(columns[field][i])
+                        for field in derived})
+        for i, record in enumerate(records)
+    ]
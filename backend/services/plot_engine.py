@@ -0,0 +1,108 @@
+"""
+Server-side bar chart data: turns a METRIC_MAP entry into a MongoDB aggregation
+pipeline that returns one value per (compressor, compressor_type), so a chart
+transfers O(compressors x types) documents instead of the whole results collection.
+frame_metric_values computes the same values from an in-memory frame of result rows
+with the NumPy metric engine.
+"""
+import pandas as pd
+from database.summary import SUMMARY_ROW_KEYS
+from services.metric_engine import aggregate_frame, source_fields
+
+# Engine statistic of each aggregation.
+ENGINE_STATS = {
+    "sum": "total",
+    "max": "peak",
+    "avg": "mean",
+    "mean": "mean",
+}
+AGGREGATION_OPERATORS = {
+    "sum": "$sum",
+    "max": "$max",
+    "avg": "$avg",
+    "mean": "$avg",
+}
+
+def shipped_row(key):
+    """The pre-aggregated CSV row (Total / Peak) a metric is read from, if any."""
+    if "peak" in key or "cpu" in key:
+        return "peak"
+    if "total" in key:
+        return "total"
+    return None
+
+def metric_pipeline(key, value_col, agg_type):
+    """
+    Aggregation pipeline yielding {compressor, compressor_type, value} per group.
+    Total / peak metrics read the row shipped in the CSVs and fall back to aggregating
+    the dataset rows when a group has none; WACR is the size-weighted ratio over the
+    datasets a compressor ran on.
+    """
+    group_id = {"compressor": "$compressor", "compressor_type": "$compressor_type"}
+    if key == "wacr":
+        match = {"dataset_key": {"$nin": SUMMARY_ROW_KEYS}, "compressed_size": {"$gt": 0}}
+        group = {
+            "_id": group_id,
+            "original_size": {"$sum": "$original_size"},
+            "compressed_size": {"$sum": "$compressed_size"},
+        }
+        value = {"$divide": ["$original_size", "$compressed_size"]}
+    else:
+        if agg_type not in AGGREGATION_OPERATORS:
+            raise ValueError(f"Unsupported aggregation: {agg_type}")
+        operator = AGGREGATION_OPERATORS[agg_type]
+        row = shipped_row(key)
+        if row is None:
+            match = {"dataset_key": {"$nin": SUMMARY_ROW_KEYS}}
+            group = {"_id": group_id, "value": {operator: f"${value_col}"}}
+            value = "$value"
+        else:
+            is_row = {"$eq": ["$dataset_key", row]}
+            match = {"dataset_key": {"$nin": [k for k in SUMMARY_ROW_KEYS if k != row]}}
+            group = {
+                "_id": group_id,
+                "row_value": {"$max": {"$cond": [is_row, f"${value_col}", None]}},
+                "value": {operator: {"$cond": [is_row, None, f"${value_col}"]}},
+            }
+            value = {"$ifNull": ["$row_value", "$value"]}
+    return [
+        {"$match": match},
+        {"$group": group},
+        {"$project": {
+            "_id": 0,
+            "compressor": "$_id.compressor",
+            "compressor_type": "$_id.compressor_type",
+            "value": value,
+        }},
+    ]
+
+def fetch_metric_values(collection, key, value_col, agg_type):
+    """Run the metric pipeline and return {(compressor, compressor_type): value}."""
+    return {
+        (doc["compressor"].strip().lower(), doc["compressor_type"].strip().lower()): doc.get("value")
+        for doc in collection.aggregate(metric_pipeline(key, value_col, agg_type))
+    }
+
+def frame_metric_values(frame, key, value_col, agg_type):
+    """In-memory equivalent of metric_pipeline over a frame of result rows (see services.metric_engine)."""
+    if key != "wacr" and agg_type not in AGGREGATION_OPERATORS:
+        raise ValueError(f"Unsupported aggregation: {agg_type}")
+    fields = ["compression_ratio"] if key == "wacr" else [value_col]
+    if not all(field in frame for field in source_fields(fields)):
+        return {}
+    stat = "weighted_compression_ratio" if key == "wacr" else f"{ENGINE_STATS[agg_type]}_{value_col}"
+    values = {group: stats.get(stat) for group, stats in aggregate_frame(frame, fields).items()}
+    row = shipped_row(key)
+    if row is not None:
+        # The shipped row wins over the aggregate, as in metric_pipeline.
+        shipped = frame[frame["dataset_key"] == row].groupby(["compressor", "compressor_type"], observed=True)[value_col].max()
+        for (comp, ctype), value in shipped.items():
+            if not pd.isna(value):
+                values[(str(comp).strip().lower(), str(ctype).strip().lower())] = float(value)
+    return values
+
+async def fetch_metric_values_async(collection, key, value_col, agg_type):
+    """Async (Motor) version of fetch_metric_values."""
+    docs = await collection.aggregate(metric_pipeline(key, value_col, agg_type)).to_list(length=None)
+    return {(doc["compressor"].strip().lower(), doc["compressor_type"].strip().lower()): doc.get("value")
+            for doc in docs}
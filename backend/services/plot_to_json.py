@@ -1,11 +1,12 @@
 import os
 import math
 from fastapi import logger
-import pandas as pd
 import plotly.graph_objects as go
-from dotenv import load_dotenv
-from pymongo import MongoClient
 import logging
+from database.result_frames import dataset_key
+from services.figure_writer import figure_writer
+from services.metric_engine import NoDataError, aggregate_frame, source_fields
+from services.storage import get_result_store
 
 # Set up logging configuration
 logging.basicConfig(
@@ -31,6 +32,9 @@ METRIC_MAP = {
     "total decompression cpu usage": ("decompression_cpu_usage", "sum"),
     "original size": ("original_size", "max"),
     "compressed size": ("compressed_size", "max"),
+    # Derived metrics (services.metric_engine), aggregated over the selected datasets.
+    "compression throughput": ("compression_throughput", "weighted"),
+    "decompression throughput": ("decompression_throughput", "weighted"),
 }
 
 DATA_TO_METRIC_MAP = {
@@ -45,8 +49,12 @@ DATA_TO_METRIC_MAP = {
     "tdm": "total decompression memory",
     "pdm": "peak decompression memory",
     # "pdc": "peak decompression cpu usage"
+    "ctp": "compression throughput",
+    "dtp": "decompression throughput",
 }
 
+DESIRED_ORDER = ['7-zip', 'paq8px', 'bsc', 'gzip', 'zstd', 'bzip2', 'zpaq', 'cmix']
+
 METRIC_COLOR_MAP = {
     "wacr": "#2dd3e4",
     "total compression time": "#FCB454",
@@ -57,6 +65,122 @@ METRIC_COLOR_MAP = {
     "decompression cpu usage": "#205781",
 }
 
+# Folder the generated figure JSON is written to.
+PLOT_METADATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'data', 'plot_metadata')
+BENCHMARK_DB_NAMES = {
+    "dna_corpus": "rlr_dna_raw",
+    "dna": "rlr_small_genomes_raw",
+}
+BAR_TYPES = ['standard', 'proposed']
+
+def benchmark_db_name(benchmark_type):
+    db_name = BENCHMARK_DB_NAMES.get(benchmark_type.lower())
+    if db_name is None:
+        raise ValueError(f"Unsupported benchmark type: {benchmark_type}")
+    return db_name
+
+def benchmark_metric_name(data_name):
+    metric_name = DATA_TO_METRIC_MAP.get(data_name.lower())
+    if not metric_name:
+        raise ValueError(f"Unsupported data name: {data_name}")
+    return metric_name
+
+def metric_spec(data_name):
+    """Normalize a metric name; returns (key, value_col, agg_type)."""
+    key = data_name.lower().strip()
+    if key == "compression cpu":
+        key = "compression cpu usage"
+    elif key == "decompression cpu":
+        key = "decompression cpu usage"
+    if key not in METRIC_MAP:
+        raise ValueError(f"Unsupported data name: {data_name}")
+    logging.info(f"Processing metric: {key}")
+    value_col, agg_type = METRIC_MAP[key]
+    return key, value_col, agg_type
+
+def bar_json_path(json_folder, db_name, key):
+    """File of the bar chart JSON of a metric under json_folder."""
+    if db_name == "rlr_dna_raw":
+        json_folder = os.path.join(json_folder, "result_less_repetitive_dna_corpus_raw")
+    elif db_name == "rlr_small_genomes_raw":
+        json_folder = os.path.join(json_folder, "result_less_repetitive_small_genomes_raw")
+    return os.path.join(json_folder, f"{key.replace(' ', '_')}.json")
+
+def summary_value(doc, key, value_col, agg_type):
+    """
+    Pick the value of a metric out of a summary document (None when it is missing).
+    Total / peak metrics prefer the values reported in the CSVs' Total / Peak rows.
+    """
+    if key == "wacr":
+        return doc.get("wacr")
+    if "peak" in key or "cpu" in key:
+        reported = doc.get(f"reported_peak_{value_col}")
+        return reported if reported is not None else doc.get(f"peak_{value_col}")
+    if "total" in key:
+        reported = doc.get(f"reported_total_{value_col}")
+        return reported if reported is not None else doc.get(f"total_{value_col}")
+    if "average" in key or agg_type in ["avg", "mean"]:
+        total = doc.get(f"total_{value_col}")
+        return total / doc["dataset_count"] if total is not None and doc.get("dataset_count") else None
+    if agg_type == "max":
+        return doc.get(f"peak_{value_col}")
+    if agg_type == "sum":
+        return doc.get(f"total_{value_col}")
+    return None
+
+def engine_fields(key, value_col):
+    """Fields the metric engine aggregates for a metric."""
+    return ["compression_ratio"] if key == "wacr" else [value_col]
+
+def aggregate_value(stats, key, value_col, agg_type):
+    """Pick the value of a metric out of the metric engine's statistics of a group."""
+    if key == "wacr":
+        return stats.get("weighted_compression_ratio")
+    if agg_type == "weighted":
+        return stats.get(f"weighted_{value_col}")
+    if "peak" in key or "cpu" in key or agg_type == "max":
+        return stats.get(f"peak_{value_col}")
+    if "total" in key or agg_type == "sum":
+        return stats.get(f"total_{value_col}")
+    if "average" in key or agg_type in ["avg", "mean"]:
+        return stats.get(f"mean_{value_col}")
+    return None
+
+def arrange_bar_values(values, key, types):
+    """
+    Lay {(compressor, compressor_type): value} out as (compressors, {ctype: [values]})
+    in the chart's compressor order; missing values are drawn as 0.
+    """
+    present = {comp for comp, _ in values}
+    compressors = [c for c in DESIRED_ORDER if c in present]
+    bar_data = {ctype: [] for ctype in types}
+    for comp in compressors:
+        for ctype in types:
+            value = values.get((comp, ctype))
+            if value is None:
+                logging.warning(f"No value for compressor '{comp}', type '{ctype}', metric '{key}'")
+                value = 0
+            logging.info(f"Encoder: {comp}, Type: {ctype}, Metric: {key}, Value: {value}")
+            bar_data[ctype].append(value)
+    return compressors, bar_data
+
+def engine_frame_fields(key, value_col):
+    return ["compressor", "compressor_type", "dataset_key"] + source_fields(engine_fields(key, value_col))
+
+def engine_values(frame, key, value_col, agg_type):
+    """{(compressor, compressor_type): value} of a metric computed by the metric engine from result rows."""
+    return {
+        group: aggregate_value(stats, key, value_col, agg_type)
+        for group, stats in aggregate_frame(frame, engine_fields(key, value_col)).items()
+    }
+
+def summary_values(summaries, key, value_col, agg_type):
+    """{(compressor, compressor_type): value} of a metric from fetch_summaries output."""
+    return {
+        (comp.strip().lower(), ctype.strip().lower()): summary_value(doc, key, value_col, agg_type)
+        for (comp, ctype), doc in summaries.items()
+    }
+
 class PlotGenerator:
 
     def __init__(self):
@@ -71,56 +195,109 @@ class PlotGenerator:
         logging.info(f"Database name set to {db_name}")
 
     def connect_to_db(self, db_name: str = "rlr_dna_raw") -> None:
-        """Connect to the MongoDB database and collection."""
+        """Select the corpus database, served by the configured storage backend."""
         try:
-            load_dotenv()
-            MONGODB_URI = os.getenv("MONGODB_URI")
-            if not MONGODB_URI:
-                raise ValueError("MONGODB_URI is not set in environment variables.")
-            self.client = MongoClient(MONGODB_URI)
-            self.db = self.client[db_name]
-            self.collection = self.db["results"]
+            self.store = get_result_store(db_name)
             self.set_db_name(db_name)
-            logging.info(f"Connected to MongoDB database: {db_name}")
+            logging.info(f"Using {type(self.store).__name__} for database: {db_name}")
         except Exception as e:
-            logging.exception(f"Failed to connect to MongoDB: {e}")
+            logging.exception(f"Failed to open storage for {db_name}: {e}")
             raise
 
-    def generate_plot_from_db(self, json_folder: str, data_name: str) -> str:
+    def summary_bar_values(self, key: str, value_col: str, agg_type: str, types: list):
+        """
+        Read the bar values of a metric from the materialized summary collection.
+        Returns (compressors, {ctype: [values]}), or None when the corpus has no summaries yet.
+        """
+        summaries = self.store.summaries()
+        if not summaries:
+            return None
+        logging.info(f"Read {len(summaries)} summaries for metric '{key}' from {self.db_name}.")
+        return arrange_bar_values(summary_values(summaries, key, value_col, agg_type), key, types)
+
+    def pipeline_bar_values(self, key: str, value_col: str, agg_type: str, types: list):
+        """
+        Compute the bar values of a metric from the results (a server-side aggregation
+        pipeline on MongoDB) for corpora without summaries.
+        """
+        values = self.store.metric_values(key, value_col, agg_type)
+        if not values:
+            raise NoDataError("No data found in the results collection.")
+        logging.info(f"Aggregated {len(values)} groups for metric '{key}'.")
+        return arrange_bar_values(values, key, types)
+
+    def engine_bar_values(self, key: str, value_col: str, agg_type: str, types: list, datasets=None):
+        """
+        Compute the bar values of a metric with the metric engine over the dataset rows,
+        restricted to `datasets` when given. Used for dataset selections and derived metrics.
+        """
+        dataset_keys = [dataset_key(d) for d in datasets] if datasets else None
+        frame = self.store.rows_frame(engine_frame_fields(key, value_col), dataset_keys)
+        values = engine_values(frame, key, value_col, agg_type)
+        if not values:
+            raise NoDataError("No data found for the selected datasets.")
+        logging.info(f"Aggregated {len(values)} groups over {len(frame)} rows for metric '{key}'.")
+        return arrange_bar_values(values, key, types)
+
+    async def bar_values_async(self, store, key: str, value_col: str, agg_type: str, types: list, datasets=None):
+        """Async version of summary_bar_values with the pipeline fallback (and of engine_bar_values)."""
+        if datasets or agg_type == "weighted":
+            dataset_keys = [dataset_key(d) for d in datasets] if datasets else None
+            frame = await store.rows_frame_async(engine_frame_fields(key, value_col), dataset_keys)
+            values = engine_values(frame, key, value_col, agg_type)
+            if not values:
+                raise NoDataError("No data found for the selected datasets.")
+            logging.info(f"Aggregated {len(values)} groups over {len(frame)} rows for metric '{key}'.")
+            return arrange_bar_values(values, key, types)
+        summaries = await store.summaries_async()
+        if summaries:
+            logging.info(f"Read {len(summaries)} summaries for metric '{key}' from {store.db_name}.")
+            return arrange_bar_values(summary_values(summaries, key, value_col, agg_type), key, types)
+        logging.info(f"No summaries in {store.db_name}; aggregating the results collection")
+        values = await store.metric_values_async(key, value_col, agg_type)
+        if not values:
+            raise NoDataError("No data found in the results collection.")
+        logging.info(f"Aggregated {len(values)} groups for metric '{key}'.")
+        return arrange_bar_values(values, key, types)
+
+    def generate_plot_from_db(self, json_folder: str, data_name: str, datasets=None) -> str:
+        """
+        Bar chart of a metric over all the datasets (from the summaries, or the pipeline
+        without them) or over a selection of datasets (computed by the metric engine).
+        Charts of a selection are not saved under json_folder.
+        """
         try:
-            key = data_name.lower().strip()
-            # For WACR, fetch documents directly from DB where dataset_id is "wacr"
-            if key == "wacr":
-                query = {"dataset_id": {"$regex": "^wacr$", "$options": "i"}}
-                logging.info("Fetching WACR documents directly from DB with query: %s", query)
-                documents = list(self.collection.find(query))
+            key, value_col, agg_type = metric_spec(data_name)
+            if datasets or agg_type == "weighted":
+                values = self.engine_bar_values(key, value_col, agg_type, BAR_TYPES, datasets)
             else:
-                logging.info("Fetching all documents from DB")
-                documents = list(self.collection.find())
-                
-            if not documents:
-                raise ValueError("No data found in the results collection.")
-
-            result_df = pd.DataFrame(documents)
-            logging.info(f"Retrieved {len(documents)} documents for metric '{key}' from MongoDB.")
-
-            # Normalize values
-            result_df['compressor_type'] = result_df['compressor_type'].str.strip().str.lower()
-            result_df['compressor'] = result_df['compressor'].str.strip().str.lower()
-            logging.debug("Normalized 'compressor_type' and 'compressor' fields")
-
-            if key == "compression cpu":
-                key = "compression cpu usage"
-            elif key == "decompression cpu":
-                key = "decompression cpu usage"
-            if key not in METRIC_MAP:
-                raise ValueError(f"Unsupported data name: {data_name}")
-            logging.info(f"Processing metric: {key}")
-
-            value_col, agg_type = METRIC_MAP[key]
-            types = ['standard', 'proposed']
-            desired_order = ['7-zip', 'paq8px', 'bsc', 'gzip', 'zstd', 'bzip2', 'zpaq', 'cmix']
-            compressors = [c.lower() for c in desired_order if c.lower() in result_df['compressor'].unique()]
+                values = self.summary_bar_values(key, value_col, agg_type, BAR_TYPES)
+            if values is None:
+                logging.info(f"No summaries in {self.db_name}; aggregating the results collection")
+                values = self.pipeline_bar_values(key, value_col, agg_type, BAR_TYPES)
+            compressors, bar_data = values
+            return self.build_plot(json_folder, self.db_name, key, data_name, compressors, bar_data,
+                                   save=not datasets)
+        except Exception as e:
+            logging.exception(f"[ERROR] generate_plot_from_db failed: {e}")
+            raise
+
+    def build_plot(self, json_folder: str, db_name: str, key: str, data_name: str, compressors: list,
+                   bar_data: dict, save: bool = True) -> str:
+        """Build the bar chart of a metric, queue its JSON to be saved under json_folder (unless save is False) and return it."""
+        fig_json = self.bar_figure(key, data_name, compressors, bar_data).to_json()
+        if save:
+            # Written in the background (see figure_writer), only with FIGURE_PERSIST.
+            figure_writer.submit(bar_json_path(json_folder, db_name, key), fig_json)
+        return fig_json
+
+    def bar_figure(self, key: str, data_name: str, compressors: list, bar_data: dict) -> go.Figure:
+        """The bar chart of a metric with values per compressor type (see arrange_bar_values)."""
+        try:
+            value_col, _ = METRIC_MAP[key]
+            types = list(bar_data)
+            if "memory" in value_col:
+                bar_data = {ctype: [v / 1024 if v else 0 for v in vals] for ctype, vals in bar_data.items()}
             x_labels = [c for c in compressors]
             base_color = METRIC_COLOR_MAP.get(key, "#85193C")
 
@@ -134,136 +311,11 @@ class PlotGenerator:
                 r, g, b = colorsys.hls_to_rgb(h, l, s)
                 return f'#{int(r*255):02x}{int(g*255):02x}{int(b*255):02x}'
 
-            bar_data = {ctype: [] for ctype in types}
             bar_colors = {
                 "standard": [adjust_color(base_color, 1.2)] * len(compressors),
                 "proposed": [adjust_color(base_color, 0.8)] * len(compressors)
             }
 
-            # Process each compressor and type:
-            for comp in compressors:
-                for ctype in types:
-                    filtered = result_df[
-                        (result_df['compressor'] == comp) &
-                        (result_df['compressor_type'] == ctype)
-                    ]
-                    logging.debug(f"Processing compressor '{comp}', type '{ctype}'. Initial rows: {len(filtered)}")
-
-                    # --- NEW LOGIC START ---
-                    if key == "wacr":
-                        filtered = filtered[filtered['dataset_id'].str.lower() == "wacr"]
-                        logging.debug(f"Filtering for 'wacr': {len(filtered)} rows found.")
-                    elif "peak" in key or "cpu" in key:
-                        filtered = filtered[filtered['dataset_id'].str.lower() == "peak"]
-                        logging.debug(f"Filtering for 'peak': {len(filtered)} rows found.")
-                    elif "total" in key:
-                        filtered = filtered[filtered['dataset_id'].str.lower() == "total"]
-                        logging.debug(f"Filtering for 'total': {len(filtered)} rows found.")
-                    elif "average" in key:
-                        filtered = filtered[filtered['dataset_id'].str.lower() != "total"]
-                        logging.debug(f"Filtering for 'average': {len(filtered)} rows after excluding 'total'.")
-                    # --- NEW LOGIC END ---
-
-                    # Calculate the value from our filtered dataset
-                    if filtered.empty:
-                        logging.warning(f"No rows found for compressor '{comp}', type '{ctype}', metric '{key}'")
-                        if key == "wacr":
-                            # Provide hard-coded defaults based on db and compressor type.
-                            if self.db_name == "rlr_dna_raw":
-                                if comp == "cmix":
-                                    value = 4.25 if ctype == "proposed" else 4.28
-                                elif comp == "gzip":
-                                    value = 4.13 if ctype == "proposed" else 3.64
-                                elif comp == "paq8px":
-                                    value = 4.24 if ctype == "proposed" else 4.3
-                                # else:
-                                #     value = 0
-                            elif self.db_name == "rlr_small_genomes_raw":
-                                if comp == "7-zip":
-                                    value = 4.14 if ctype == "proposed" else 3.9
-                                elif comp == "paq8px":
-                                    value = 4.27 if ctype == "proposed" else 4.4
-                                elif comp == "bsc":
-                                    value = 4.09 if ctype == "proposed" else 4.08
-                                elif comp == "gzip":
-                                    value = 4.13 if ctype == "proposed" else 3.73
-                                elif comp == "zstd":
-                                    value = 4.19 if ctype == "proposed" else 4.12
-                                elif comp == "bzip2":
-                                    value = 4.03 if ctype == "proposed" else 3.79
-                                elif comp == "zpaq":
-                                    value = 4.04 if ctype == "proposed" else 4.03
-                                elif comp == "cmix":
-                                    value = 4.25 if ctype == "proposed" else 4.39
-                                else:
-                                    value = 0
-                        else:
-                            value = 0
-                    else:
-                        if self.db_name == "rlr_dna_raw":
-                            if key == "wacr":
-                                if comp == "7-zip":
-                                    value = 3.90 if ctype == "standard" else 4.47
-                                elif comp == "paq8px":
-                                    value = 4.30 if ctype == "standard" else 4.24
-                                elif comp == "bsc":
-                                    value = 4.47 if ctype == "standard" else 4.50
-                                elif comp == "gzip":
-                                    value = 3.64 if ctype == "standard" else 4.13
-                                elif comp == "zstd":
-                                    value = 4.30 if ctype == "standard" else 4.80
-                                elif comp == "bzip2":
-                                    value = 3.81 if ctype == "standard" else 4.14
-                                elif comp == "zpaq":
-                                    value = 4.47 if ctype == "standard" else 4.48
-                                elif comp == "cmix":
-                                    value = 4.28 if ctype == "standard" else 4.25
-                                else:
-                                    value = 0
-                                # if comp == "cmix":
-                                #     value = 4.25 if ctype == "proposed" else 4.28
-                                # elif comp == "gzip":
-                                #     value  4.13 if ctype == "proposed" else 3.64
-                                # elif comp == "paq8px":
-                                #     value = 4.24 if ctype == "proposed" else 4.3
-                                # # else:
-                                # #     sum_original = filtered["original_size"].sum()
-                                # #     sum_compressed = filtered["compressed_size"].sum()
-                                # #     value = round(sum_original / sum_compressed, 4) if sum_compressed else 0
-                            elif agg_type == "max":
-                                value = filtered[value_col].max()
-                            elif agg_type == "sum":
-                                value = filtered[value_col].sum()
-                            elif agg_type in ["avg", "mean"]:
-                                value = filtered[value_col].mean()
-                            else:
-                                value = 0
-                        elif self.db_name == "rlr_small_genomes_raw":
-                            if comp == "7-zip":
-                                value = 4.14 if ctype == "proposed" else 3.9
-                            elif comp == "paq8px":
-                                value = 4.27 if ctype == "proposed" else 4.4
-                            elif comp == "bsc":
-                                value = 4.09 if ctype == "proposed" else 4.08
-                            elif comp == "gzip":
-                                value = 4.13 if ctype == "proposed" else 3.73
-                            elif comp == "zstd":
-                                value = 4.19 if ctype == "proposed" else 4.12
-                            elif comp == "bzip2":
-                                value = 4.03 if ctype == "proposed" else 3.79
-                            elif comp == "zpaq":
-                                value = 4.04 if ctype == "proposed" else 4.03
-                            elif comp == "cmix":
-                                value = 4.25 if ctype == "proposed" else 4.39
-                            else:
-                                value = 0
-
-                    if "memory" in value_col:
-                        value = value / 1024 if value else 0
-
-                    logging.info(f"Encoder: {comp}, Type: {ctype}, Metric: {key}, Value: {value}")
-                    bar_data[ctype].append(value)
-
             # Prepare the bar plot
             fig = go.Figure()
             for idx, ctype in enumerate(types):
@@ -320,6 +372,8 @@ class PlotGenerator:
                     y_axis_label = "PDC (%)"
                 else:
                     y_axis_label = "PCC (%)"
+            elif "throughput" in value_col:
+                y_axis_label = f"{camel_label.strip()} (MB/s)"
 
             fig.update_layout(
                 plot_bgcolor='white',
@@ -351,39 +405,45 @@ class PlotGenerator:
                 showlegend=False
             )
 
-            os.makedirs(json_folder, exist_ok=True)
-            if self.db_name == "rlr_dna_raw":
-                json_folder = os.path.join(json_folder, "result_less_repetitive_dna_corpus_raw")
-            elif self.db_name == "rlr_small_genomes_raw":
-                json_folder = os.path.join(json_folder, "result_less_repetitive_small_genomes_raw")
-            json_path = os.path.join(json_folder, f"{key.replace(' ', '_')}.json")
-            logging.info(f"Saving plot to {json_path}")
-            fig.write_json(json_path)
-            logging.info("Plot saved successfully.")
-            return fig.to_json()
+            return fig
 
         except Exception as e:
-            logging.exception(f"[ERROR] generate_plot_from_db failed: {e}")
+            logging.exception(f"[ERROR] bar_figure failed: {e}")
             raise
 
-    def generate_data_by_name(self, benchmark_type: str, data_name: str) -> str:
+    def generate_data_by_name(self, benchmark_type: str, data_name: str, datasets=None) -> str:
         try:
             logging.info(f"Generating data for benchmark type: {benchmark_type}, data name: {data_name}")
-            base_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'data', 'plot_metadata')
-            db_list = ["rlr_dna_raw", "rlr_small_genomes_raw"]
-            benchmark_type_list = ["dna_corpus", "dna"]
-            if benchmark_type.lower() not in benchmark_type_list:
-                raise ValueError(f"Unsupported benchmark type: {benchmark_type}")
-            if benchmark_type.lower() == "dna_corpus":
-                db_name = db_list[0]
-            elif benchmark_type.lower() == "dna":
-                db_name = db_list[1]
+            db_name = benchmark_db_name(benchmark_type)
             self.connect_to_db(db_name)
-            metric_name = DATA_TO_METRIC_MAP.get(data_name.lower())
-            if not metric_name:
-                raise ValueError(f"Unsupported data name: {data_name}")
+            metric_name = benchmark_metric_name(data_name)
             logging.info(f"Generating plot for benchmark: {benchmark_type}, data metric: {data_name}")
-            return self.generate_plot_from_db(base_dir, metric_name)
+            return self.generate_plot_from_db(PLOT_METADATA_DIR, metric_name, datasets)
         except Exception as e:
             logging.exception(f"[ERROR] generate_data_by_name failed: {e}")
             raise
+
+    async def generate_data_by_name_async(self, benchmark_type: str, data_name: str, datasets=None) -> str:
+        """
+        Async version of generate_data_by_name for the async routes: the data is read
+        through the async store methods and no per-request state is stored on the generator,
+        so concurrent requests for different corpora do not interfere.
+        """
+        return (await self.figure_by_name_async(benchmark_type, data_name, datasets)).to_json()
+
+    async def figure_by_name_async(self, benchmark_type: str, data_name: str, datasets=None) -> go.Figure:
+        """The figure of generate_data_by_name_async, for callers that render it themselves."""
+        try:
+            logging.info(f"Generating data for benchmark type: {benchmark_type}, data name: {data_name}")
+            db_name = benchmark_db_name(benchmark_type)
+            metric_name = benchmark_metric_name(data_name)
+            key, value_col, agg_type = metric_spec(metric_name)
+            store = get_result_store(db_name)
+            compressors, bar_data = await self.bar_values_async(store, key, value_col, agg_type, BAR_TYPES, datasets)
+            fig = self.bar_figure(key, metric_name, compressors, bar_data)
+            if not datasets:
+                figure_writer.submit(bar_json_path(PLOT_METADATA_DIR, db_name, key), fig)
+            return fig
+        except Exception as e:
+            logging.exception(f"[ERROR] figure_by_name_async failed: {e}")
+            raise
@@ -1,204 +1,230 @@
 import os
+import colorsys
+import numpy as np
 import pandas as pd
 import plotly.graph_objects as go
 import plotly.colors
-from pymongo import MongoClient
-from dotenv import load_dotenv
-
-# Load environment variables
-load_dotenv()
-MONGODB_URI = os.getenv("MONGODB_URI")
-if not MONGODB_URI:
-    raise ValueError("MONGODB_URI is not set in environment variables.")
-
-# Connect to MongoDB and choose the desired database and collection.
-client = MongoClient(MONGODB_URI)
-# db = client["rlr_small_genomes_raw"]  # Use your normalized DB name here
-db = client["rlr_dna_raw"]  # Use your normalized DB name here
-collection = db["results"]
+from services.figure_writer import figure_writer
+from services.metric_engine import NoDataError, aggregate_frame, source_fields
+from services.storage import get_result_store
+
+# Metric -> (shipped row, field, axis label, scale). Sizes are in KB, memory is shown in MB.
+SCATTER_METRICS = {
+    "wacr": ("wacr", "compressed_size", "WACR", 1.0),
+    "total compression time": ("total", "compression_time", "TCT (s)", 1.0),
+    "total decompression time": ("total", "decompression_time", "TDT (s)", 1.0),
+    "total compressed size": ("total", "compressed_size", "Compression Size (KB)", 1.0),
+    "peak compression memory": ("peak", "compression_memory", "PCM (MB)", 1 / 1024),
+    "peak decompression memory": ("peak", "decompression_memory", "PDM (MB)", 1 / 1024),
+    "peak compression cpu usage": ("peak", "compression_cpu_usage", "PCC (%)", 1.0),
+    "peak decompression cpu usage": ("peak", "decompression_cpu_usage", "PDC (%)", 1.0),
+}
+# Short names, as used by the bar charts.
+SCATTER_METRIC_ALIASES = {
+    "tct": "total compression time",
+    "tdt": "total decompression time",
+    "size": "total compressed size",
+    "pcm": "peak compression memory",
+    "pdm": "peak decompression memory",
+    "pcc": "peak compression cpu usage",
+    "pdc": "peak decompression cpu usage",
+    "compression cpu usage": "peak compression cpu usage",
+    "decompression cpu usage": "peak decompression cpu usage",
+}
+# The shipped rows the points are read from (string fields are normalized at ingest).
+SCATTER_ROW_KEYS = ["total", "peak", "wacr"]
+SCATTER_ORDER = ['7-zip', 'paq8px', 'bsc', 'gzip', 'zstd', 'bzip2', 'zpaq', 'cmix']
+MARKER_SYMBOLS = ["circle", "square", "diamond", "cross", "x", "star", "hexagon", "pentagon"]
+# Color shade of each compressor type: a much darker one for 'standard', the base one for 'proposed'.
+TYPE_SHADES = {"standard": 0.6, "proposed": 1.0}
+
+def scatter_metric_spec(name):
+    """Normalize a scatter metric name; returns (key, row key, field, axis label, scale)."""
+    key = name.lower().strip()
+    key = SCATTER_METRIC_ALIASES.get(key, key)
+    if key not in SCATTER_METRICS:
+        raise ValueError(f"Unsupported scatter metric: {name} (use one of {', '.join(SCATTER_METRICS)})")
+    return (key,) + SCATTER_METRICS[key]
+
+def engine_stat(row_key, field):
+    """(metric engine field, statistic) standing in for a shipped value when its row is missing."""
+    if row_key == "wacr":
+        return "compression_ratio", "weighted_compression_ratio"
+    return field, f"{row_key}_{field}"
+
+def scatter_points(frame, specs):
+    """
+    Pivot the shipped rows in frame once into one row per (compressor, compressor_type)
+    with a column per metric spec (NaN where the shipped row or value is missing).
+    """
+    fields = sorted({spec[2] for spec in specs})
+    wide = (frame.groupby(["compressor", "compressor_type", "dataset_key"], observed=True)[fields]
+                 .first().unstack("dataset_key"))
+    return pd.DataFrame({
+        spec[0]: wide[(spec[2], spec[1])] if (spec[2], spec[1]) in wide else np.nan for spec in specs
+    }, index=wide.index)
+
+def fill_points(points, dataset_frame, specs):
+    """Fill the missing values of scatter_points from the metric engine's aggregates of the dataset rows."""
+    stats = aggregate_frame(dataset_frame, sorted({engine_stat(spec[1], spec[2])[0] for spec in specs}))
+    groups = [(str(comp).strip().lower(), str(ctype).strip().lower()) for comp, ctype in points.index]
+    points = points.copy()
+    for spec in specs:
+        _, stat = engine_stat(spec[1], spec[2])
+        computed = np.array([stats.get(group, {}).get(stat) for group in groups], dtype="float64")
+        points[spec[0]] = points[spec[0]].fillna(pd.Series(computed, index=points.index))
+    return points
+
+def compressor_order(compressors):
+    """The known compressors in their usual order, then any others alphabetically."""
+    known = [c for c in SCATTER_ORDER if c in compressors]
+    return known + sorted(c for c in compressors if c not in SCATTER_ORDER)
+
+def adjust_color(color, factor):
+    color = color.lstrip('#')
+    lv = len(color)
+    rgb = tuple(int(color[i:i + lv // 3], 16) for i in range(0, lv, lv // 3))
+    h, l, s = colorsys.rgb_to_hls(*(v / 255 for v in rgb))
+    l = max(0, min(1, l * factor))
+    r, g, b = colorsys.hls_to_rgb(h, l, s)
+    return f'#{int(r*255):02x}{int(g*255):02x}{int(b*255):02x}'
 
 class ScatterPlotGenerator:
-    def get_total_row(self, df: pd.DataFrame, comp: str, ctype: str):
-        """Return the row where dataset_id == 'Total' for the given compressor and type."""
-        filtered = df[
-            (df['compressor'] == comp) &
-            (df['compressor_type'] == ctype) &
-            (df['dataset_id'].str.lower() == "total")
-        ]
-        return filtered.iloc[0] if not filtered.empty else None
-
-    def get_wacr_row(self, df: pd.DataFrame, comp: str, ctype: str):
-        """Return the row where dataset_id == 'Total' for the given compressor and type."""
-        filtered = df[
-            (df['compressor'] == comp) &
-            (df['compressor_type'] == ctype) &
-            (df['dataset_id'].str.lower() == "wacr")
-        ]
-        # print(f"Filtered WACR row: {filtered.head()}")
-        # print("passed the function get_wacr_row")
-        # print(f"filtered row size: {len(filtered)}")
-        if len(filtered) == 0:
-            print("No WACR row found")
-            return None
-        return filtered.iloc[0] if not filtered.empty else None
-    
-    def calculate_wacr(self, row) -> float:
-        """
-        Calculate WACR as sum(original_size) / sum(compressed_size) for the 'Total' row.
-        If not available, return a default value based on the compressor.
-        """
-        if row is None:
-            print("No row found for WACR calculation")
-            return 0
-        try:
-            # print(f"Row for WACR calculation: {row}")
-            # sum_original = row.get("original_size", 0)
-            sum_compressed = row.get("compressed_size", 0)
-            # return round(sum_original / sum_compressed, 4) if sum_compressed else 0
-            return round(sum_compressed, 4) if sum_compressed else 0
-        except Exception as e:
-            print(f"[ERROR] calculate_wacr failed: {e}")
-            return 0
+    def __init__(self, db_name: str = "rlr_dna_raw"):
+        self.db_name = db_name
+
+    @property
+    def store(self):
+        """The corpus store of the configured storage backend."""
+        return get_result_store(self.db_name)
+
+    def json_path(self, json_folder: str, x_metric: str, y_metric: str) -> str:
+        """File of the scatter plot JSON, prefixed with the database name."""
+        return os.path.join(
+            json_folder,
+            f"{self.db_name}_{x_metric.lower().replace(' ', '_')}_vs_{y_metric.lower().replace(' ', '_')}.json"
+        )
+
+    def frame_fields(self, specs):
+        return ["dataset_id", "dataset_key", "compressor", "compressor_type"] + sorted({spec[2] for spec in specs})
+
+    def dataset_fields(self, specs):
+        return ["dataset_key", "compressor", "compressor_type"] + source_fields(
+            sorted({engine_stat(spec[1], spec[2])[0] for spec in specs}))
+
+    def points(self, specs):
+        """scatter_points of the corpus, with the values of missing shipped rows computed from the datasets."""
+        points = scatter_points(self.store.rows_frame(self.frame_fields(specs), SCATTER_ROW_KEYS), specs)
+        if points.isna().any().any():
+            points = fill_points(points, self.store.rows_frame(self.dataset_fields(specs)), specs)
+        return points
+
+    async def points_async(self, specs):
+        """Async version of points."""
+        frame = await self.store.rows_frame_async(self.frame_fields(specs), SCATTER_ROW_KEYS)
+        points = scatter_points(frame, specs)
+        if points.isna().any().any():
+            points = fill_points(points, await self.store.rows_frame_async(self.dataset_fields(specs)), specs)
+        return points
 
-    def get_total_time(self, row, col_name) -> float:
-        """Return the total time value from the 'Total' row for the given column."""
-        if row is None:
-            return 0
+    def generate_scatter_plot(self, json_folder: str, x_metric: str = "WACR", y_metric: str = "Total Compression Time") -> str:
         try:
-            return row.get(col_name, 0)
+            x_spec, y_spec = scatter_metric_spec(x_metric), scatter_metric_spec(y_metric)
+            fig_json = self.scatter_figure(self.points([x_spec, y_spec]), x_spec, y_spec).to_json()
+            # Written in the background (see figure_writer), only with FIGURE_PERSIST.
+            figure_writer.submit(self.json_path(json_folder, x_spec[0], y_spec[0]), fig_json)
+            return fig_json
         except Exception as e:
-            print(f"[ERROR] get_total_time failed: {e}")
-            return 0
+            print(f"[ERROR] generate_scatter_plot failed: {e}")
+            raise
 
-    def generate_scatter_plot(self, json_folder: str, x_metric: str = "WACR", y_metric: str = "Total Compression Time") -> str:
-        try:
-            # Retrieve all documents and build DataFrame.
-            documents = list(collection.find())
-            if not documents:
-                raise ValueError("No data in results collection.")
-            df = pd.DataFrame(documents)
-
-            # Normalize string fields.
-            df['compressor_type'] = df['compressor_type'].str.strip().str.lower()
-            df['compressor'] = df['compressor'].str.strip().str.lower()
-            df['dataset_id'] = df['dataset_id'].str.strip()
-
-            # compressors = sorted(df['compressor'].unique())
-            compressors = ['7-zip', 'paq8px', 'bsc',
-                           'gzip', 'zstd', 'bzip2', 'zpaq', 'cmix']
-            base_colors = plotly.colors.qualitative.Plotly
-            color_map = {comp: base_colors[i % len(base_colors)] for i, comp in enumerate(compressors)}
-            marker_symbols = ["circle", "square", "diamond", "cross", "x", "star", "hexagon", "pentagon"]
-            comp_shapes = {comp: marker_symbols[i % len(marker_symbols)] for i, comp in enumerate(compressors)}
-
-            # Define which column to use for total time
-            y_col = "decompression_time" if y_metric.lower().startswith("total decompression") else "compression_time"
-
-            def adjust_color(color, factor):
-                import colorsys
-                color = color.lstrip('#')
-                lv = len(color)
-                rgb = tuple(int(color[i:i + lv // 3], 16) for i in range(0, lv, lv // 3))
-                h, l, s = colorsys.rgb_to_hls(*(v / 255 for v in rgb))
-                l = max(0, min(1, l * factor))
-                r, g, b = colorsys.hls_to_rgb(h, l, s)
-                return f'#{int(r*255):02x}{int(g*255):02x}{int(b*255):02x}'
-
-            fig = go.Figure()
-            # print("Compressor\tType\tWACR\tTotal Decompression Time\tOriginal Size\tCompressed Size")
-            # Use a base and a much darker shade for 'standard' and 'proposed'
-            # 0.6 = much darker, 1.0 = base
-            for comp in compressors:
-                for ctype, factor in zip(['standard', 'proposed'], [0.6, 1.0]):
-                    row = self.get_total_row(df, comp, ctype)
-                    if row is None:
-                        continue
-                    row1 = self.get_wacr_row(df, comp, ctype)
-                    if row1 is None:
-                        continue
-                    # X value: WACR (always from 'Total' row)
-                    if x_metric.lower() == "wacr":
-                        x_val = self.calculate_wacr(row1)
-                    elif x_metric.lower().startswith("total decompression"):
-                        x_val = self.get_total_time(row, "decompression_time")
-                    elif x_metric.lower().startswith("total compression"):
-                        x_val = self.get_total_time(row, "compression_time")
-                    else:
-                        x_val = row.get(x_metric.lower().replace(" ", "_"), 0)
-
-                    # Y value: Total Decompression Time (always from 'Total' row)
-                    if y_metric.lower() == "wacr":
-                        y_val = self.calculate_wacr(row)
-                    elif y_metric.lower().startswith("total decompression"):
-                        y_val = self.get_total_time(row, "decompression_time")
-                    elif y_metric.lower().startswith("total compression"):
-                        y_val = self.get_total_time(row, "compression_time")
-                    else:
-                        y_val = row.get(y_metric.lower().replace(" ", "_"), 0)
-
-                    # Show original and compressed size used in WACR calculation
-                    orig_size = row.get("original_size", 0)
-                    comp_size = row.get("compressed_size", 0)
-
-                    # Use a much darker shade for 'standard', base for 'proposed'
-                    marker_color = adjust_color(color_map[comp], factor)
-
-                    # Log WACR vs TDT for all, with sizes
-                    # print(f"{comp}\t{ctype}\t{x_val}\t{y_val}\t{orig_size}\t{comp_size}")
-
-                    label = ('S' if ctype == 'standard' else 'P') + '-' + comp
-                    fig.add_trace(go.Scatter(
-                        x=[x_val],
-                        y=[y_val],
-                        mode='markers',
-                        name=label,
-                        marker=dict(
-                            size=10,
-                            opacity=0.8,
-                            color=marker_color,
-                            symbol=comp_shapes[comp]
-                        ),
-                        text=[row['dataset_id']],
-                    ))
-
-            fig.update_layout(
-                plot_bgcolor='white',
-                paper_bgcolor='white',
-                xaxis=dict(
-                    title=x_metric,
-                    showline=True,
-                    linecolor='black',
-                    linewidth=1,
-                    mirror=False
-                ),
-                yaxis=dict(
-                    title=f"TCT (s)",
-                    showline=True,
-                    linecolor='black',
-                    linewidth=1,
-                    mirror=False
-                ),
-                height=600,
-                title_x=0.5
-            )
-
-            os.makedirs(json_folder, exist_ok=True)
-            # Use db.name as prefix for the file name
-            db_name = db.name if hasattr(db, "name") else "results"
-            json_path = os.path.join(
-                json_folder,
-                f"{db_name}_{x_metric.lower().replace(' ', '_')}_vs_{y_metric.lower().replace(' ', '_')}.json"
-            )
-            fig.write_json(json_path)
-            return fig.to_json()
+    async def generate_scatter_plot_async(self, json_folder: str, x_metric: str = "WACR",
+                                          y_metric: str = "Total Compression Time") -> str:
+        """Async version of generate_scatter_plot."""
+        return (await self.scatter_figure_async(json_folder, x_metric, y_metric)).to_json()
 
+    async def scatter_figure_async(self, json_folder: str, x_metric: str = "WACR",
+                                   y_metric: str = "Total Compression Time") -> go.Figure:
+        """The figure of generate_scatter_plot_async, for callers that render it themselves."""
+        try:
+            x_spec, y_spec = scatter_metric_spec(x_metric), scatter_metric_spec(y_metric)
+            fig = self.scatter_figure(await self.points_async([x_spec, y_spec]), x_spec, y_spec)
+            figure_writer.submit(self.json_path(json_folder, x_spec[0], y_spec[0]), fig)
+            return fig
         except Exception as e:
-            print(f"[ERROR] generate_scatter_plot failed: {e}")
+            print(f"[ERROR] scatter_figure_async failed: {e}")
             raise
 
-    def generate_and_save(self):
+    def scatter_figure(self, points: pd.DataFrame, x_spec, y_spec) -> go.Figure:
+        """
+        The scatter plot of the points of scatter_points: one trace per (compressor, type)
+        with both values, colored per compressor and shaded per type.
+        """
+        x_key, y_key = x_spec[0], y_spec[0]
+        points = points.dropna(subset=[x_key, y_key])
+        if points.empty:
+            raise NoDataError(f"No {x_key} / {y_key} values in {self.db_name}.")
+        x_values = points[x_key].to_numpy() * x_spec[4]
+        y_values = points[y_key].to_numpy() * y_spec[4]
+        position = {group: i for i, group in enumerate(points.index)}
+
+        compressors = compressor_order(set(points.index.get_level_values(0)))
+        base_colors = plotly.colors.qualitative.Plotly
+        # Hover text: the shipped row of the y value (Total / Peak / WACR).
+        row_label = "WACR" if y_spec[1] == "wacr" else y_spec[1].capitalize()
+        traces = []
+        for n, comp in enumerate(compressors):
+            for ctype, factor in TYPE_SHADES.items():
+                i = position.get((comp, ctype))
+                if i is None:
+                    continue
+                traces.append(dict(
+                    type="scatter",
+                    x=[float(x_values[i])],
+                    y=[float(y_values[i])],
+                    mode='markers',
+                    name=('S' if ctype == 'standard' else 'P') + '-' + comp,
+                    marker=dict(
+                        size=10,
+                        opacity=0.8,
+                        color=adjust_color(base_colors[n % len(base_colors)], factor),
+                        symbol=MARKER_SYMBOLS[n % len(MARKER_SYMBOLS)],
+                    ),
+                    text=[row_label],
+                ))
+
+        fig = go.Figure(data=traces)
+        fig.update_layout(
+            plot_bgcolor='white',
+            paper_bgcolor='white',
+            xaxis=dict(
+                title=x_spec[3],
+                showline=True,
+                linecolor='black',
+                linewidth=1,
+                mirror=False
+            ),
+            yaxis=dict(
+                title=y_spec[3],
+                showline=True,
+                linecolor='black',
+                linewidth=1,
+                mirror=False
+            ),
+            height=600,
+            title_x=0.5
+        )
+        return fig
+
+    def generate_and_save(self, x_metric: str = "WACR", y_metric: str = "Total Compression Time"):
         # Get the absolute path to the project root (two levels up from this file)
         project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
         base_dir = os.path.join(project_root, 'data', 'plot_metadata')
-        print(f"Saving JSON to {base_dir}")
-        return self.generate_scatter_plot(base_dir)
+        # generate_scatter_plot queues the file with the figure writer; wait until it is written.
+        fig_json = self.generate_scatter_plot(base_dir, x_metric, y_metric)
+        if figure_writer.enabled:
+            figure_writer.flush()
+            print(f"Saved JSON to {base_dir}")
+        else:
+            print(f"Not saving JSON to {base_dir}: set FIGURE_PERSIST=true")
+        return fig_json
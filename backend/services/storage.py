@@ -0,0 +1,271 @@
+"""
+Storage backends behind TabularData, PlotGenerator and ScatterPlotGenerator.
+Each corpus database is served by a ResultStore:
+  - MongoResultStore reads the results/summary collections (sync pymongo and async Motor);
+  - ParquetResultStore serves an in-memory copy of a local Parquet snapshot built with
+    `python -m database.snapshot`, so the API runs with no database server.
+The backend is chosen with STORAGE_BACKEND=mongodb (default) or parquet.
+"""
+import os
+import time
+import threading
+import logging
+from abc import ABC, abstractmethod
+import pandas as pd
+from database.connection import get_client, get_async_client, close_client, require_mongodb_uri
+from database.db import DB_DNA, DB_SMALL_GENOMES
+from database.export import COLLECTION_NAME, KEY_FIELDS
+from database.generation import fetch_generation, fetch_generation_async
+from database.frames import field_types, load_frame, load_frame_async
+from database.snapshot import SNAPSHOT_DIR, snapshot_path
+from database.summary import SUMMARY_ROW_KEYS, fetch_summaries, fetch_summaries_async, frame_summaries
+from services.plot_engine import fetch_metric_values, fetch_metric_values_async, frame_metric_values
+
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "mongodb").lower()
+STORAGE_BACKENDS = ("mongodb", "parquet")
+# Longest time cached results may be served after an ingest bumped the data generation.
+GENERATION_CHECK_SECONDS = float(os.getenv("GENERATION_CHECK_SECONDS", "1"))
+
+class ResultStore(ABC):
+    """
+    Read operations the services need from one corpus database. The *_async
+    variants are awaited by the async routes.
+    """
+    def __init__(self, db_name: str):
+        self.db_name = db_name
+
+    @abstractmethod
+    def find_results(self, dataset_ids, compressors_by_type, fields) -> list:
+        """
+        Result documents of the given datasets for {compressor_type: [compressor, ...]},
+        in one query, with the key fields and `fields` only.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def summaries(self) -> dict:
+        """{(compressor, compressor_type): summary document}; empty when there are none."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def metric_values(self, key, value_col, agg_type) -> dict:
+        """{(compressor, compressor_type): value} of a bar chart metric (see plot_engine)."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def rows_frame(self, fields, dataset_keys=None) -> pd.DataFrame:
+        """
+        Typed frame (see database.frames) of the rows whose dataset_key is in dataset_keys,
+        or of all the dataset rows (no shipped Total / Peak / WACR rows) when it is None.
+        """
+        raise NotImplementedError
+
+    def generation(self):
+        """Version of the stored data, changed by every ingest; None disables result caching."""
+        return None
+
+    async def find_results_async(self, dataset_ids, compressors_by_type, fields) -> list:
+        return self.find_results(dataset_ids, compressors_by_type, fields)
+
+    async def summaries_async(self) -> dict:
+        return self.summaries()
+
+    async def metric_values_async(self, key, value_col, agg_type) -> dict:
+        return self.metric_values(key, value_col, agg_type)
+
+    async def rows_frame_async(self, fields, dataset_keys=None) -> pd.DataFrame:
+        return self.rows_frame(fields, dataset_keys)
+
+    async def generation_async(self):
+        return self.generation()
+
+class MongoResultStore(ResultStore):
+    """
+    A corpus database on the MongoDB server, through the process-wide pooled clients.
+    The data generation written by the ingester is re-read at most every
+    GENERATION_CHECK_SECONDS.
+    """
+    def __init__(self, db_name: str):
+        super().__init__(db_name)
+        self._generation = None  # (monotonic time read, generation)
+
+    def _recent_generation(self):
+        if self._generation is not None and time.monotonic() - self._generation[0] < GENERATION_CHECK_SECONDS:
+            return self._generation[1]
+        return None
+
+    @property
+    def db(self):
+        return get_client()[self.db_name]
+
+    @property
+    def async_db(self):
+        return get_async_client()[self.db_name]
+
+    @staticmethod
+    def results_query(dataset_ids, compressors_by_type, fields):
+        """Filter and projection of find_results (served by the natural key index)."""
+        query = {
+            "dataset_id": {"$in": list(dataset_ids)},
+            "$or": [{"compressor_type": compressor_type, "compressor": {"$in": list(compressors)}}
+                    for compressor_type, compressors in compressors_by_type.items()],
+        }
+        projection = {field: 1 for field in KEY_FIELDS + list(fields)}
+        projection["_id"] = 0
+        return query, projection
+
+    def find_results(self, dataset_ids, compressors_by_type, fields):
+        return list(self.db[COLLECTION_NAME].find(*self.results_query(dataset_ids, compressors_by_type, fields)))
+
+    def summaries(self):
+        return fetch_summaries(self.db)
+
+    def metric_values(self, key, value_col, agg_type):
+        return fetch_metric_values(self.db[COLLECTION_NAME], key, value_col, agg_type)
+
+    @staticmethod
+    def rows_query(dataset_keys):
+        if dataset_keys is None:
+            return {"dataset_key": {"$nin": SUMMARY_ROW_KEYS}}
+        return {"dataset_key": {"$in": list(dataset_keys)}}
+
+    def rows_frame(self, fields, dataset_keys=None):
+        return load_frame(self.db[COLLECTION_NAME], fields, self.rows_query(dataset_keys))
+
+    def generation(self):
+        generation = self._recent_generation()
+        if generation is None:
+            generation = fetch_generation(self.db)
+            self._generation = (time.monotonic(), generation)
+        return generation
+
+    async def find_results_async(self, dataset_ids, compressors_by_type, fields):
+        cursor = self.async_db[COLLECTION_NAME].find(*self.results_query(dataset_ids, compressors_by_type, fields))
+        return await cursor.to_list(length=None)
+
+    async def summaries_async(self):
+        return await fetch_summaries_async(self.async_db)
+
+    async def metric_values_async(self, key, value_col, agg_type):
+        return await fetch_metric_values_async(self.async_db[COLLECTION_NAME], key, value_col, agg_type)
+
+    async def rows_frame_async(self, fields, dataset_keys=None):
+        return await load_frame_async(self.async_db[COLLECTION_NAME], fields, self.rows_query(dataset_keys))
+
+    async def generation_async(self):
+        generation = self._recent_generation()
+        if generation is None:
+            generation = await fetch_generation_async(self.async_db)
+            self._generation = (time.monotonic(), generation)
+        return generation
+
+class ParquetResultStore(ResultStore):
+    """
+    A corpus database served from its Parquet snapshot, loaded once into memory and
+    reloaded when the snapshot file changes. Summaries are computed at load time.
+    """
+    def __init__(self, db_name: str, snapshot_dir: str = SNAPSHOT_DIR):
+        super().__init__(db_name)
+        self.path = snapshot_path(db_name, snapshot_dir=snapshot_dir)
+        self._lock = threading.Lock()
+        self._loaded = None  # (mtime, frame, documents by key, summaries)
+
+    def load(self):
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError as e:
+            raise RuntimeError(f"No Parquet snapshot for {self.db_name} at {self.path} "
+                               "(build it with `python -m database.snapshot`)") from e
+        with self._lock:
+            if self._loaded is None or self._loaded[0] != mtime:
+                frame = pd.read_parquet(self.path)
+                documents = {}
+                for record in frame.to_dict("records"):
+                    doc = {k: v for k, v in record.items() if not (isinstance(v, float) and v != v)}
+                    documents.setdefault((doc["dataset_id"], doc["compressor"], doc["compressor_type"]), []).append(doc)
+                self._loaded = (mtime, frame, documents, frame_summaries(frame))
+                logging.info(f"Loaded {len(frame)} rows of {self.db_name} from {self.path}")
+            return self._loaded
+
+    @property
+    def frame(self):
+        return self.load()[1]
+
+    def find_results(self, dataset_ids, compressors_by_type, fields):
+        documents = self.load()[2]
+        wanted = KEY_FIELDS + list(fields)
+        return [
+            {field: doc[field] for field in wanted if field in doc}
+            for dataset_id in dict.fromkeys(dataset_ids)
+            for compressor_type, compressors in compressors_by_type.items()
+            for compressor in dict.fromkeys(compressors)
+            for doc in documents.get((dataset_id, compressor, compressor_type), [])
+        ]
+
+    def summaries(self):
+        return self.load()[3]
+
+    def metric_values(self, key, value_col, agg_type):
+        return frame_metric_values(self.frame, key, value_col, agg_type)
+
+    def rows_frame(self, fields, dataset_keys=None):
+        frame = self.frame
+        if dataset_keys is None:
+            rows = frame[~frame["dataset_key"].isin(SUMMARY_ROW_KEYS)]
+        else:
+            rows = frame[frame["dataset_key"].isin(list(dataset_keys))]
+        columns = {}
+        for field, dtype in field_types(fields).items():
+            column = rows[field] if field in rows else pd.Series([None] * len(rows), index=rows.index)
+            columns[field] = column.astype(dtype)
+        return pd.DataFrame(columns).reset_index(drop=True)
+
+    def generation(self):
+        # The snapshot's modification time: rebuilding the snapshot invalidates cached results.
+        return self.load()[0]
+
+STORE_CLASSES = {
+    "mongodb": MongoResultStore,
+    "parquet": ParquetResultStore,
+}
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+def get_result_store(db_name: str) -> ResultStore:
+    """The ResultStore of a corpus database for the configured STORAGE_BACKEND."""
+    if STORAGE_BACKEND not in STORE_CLASSES:
+        raise ValueError(f"Unsupported STORAGE_BACKEND: {STORAGE_BACKEND} (use one of {', '.join(STORAGE_BACKENDS)})")
+    with _stores_lock:
+        store = _stores.get(db_name)
+        if store is None:
+            store = STORE_CLASSES[STORAGE_BACKEND](db_name)
+            _stores[db_name] = store
+        return store
+
+# FastAPI dependencies handing out the stores of the two dashboard corpora.
+def get_store_dna() -> ResultStore:
+    return get_result_store(DB_DNA)
+
+def get_store_small_genomes() -> ResultStore:
+    return get_result_store(DB_SMALL_GENOMES)
+
+def open_storage(db_names=(DB_DNA, DB_SMALL_GENOMES)):
+    """App startup: open the pooled clients, or load the snapshots into memory."""
+    if STORAGE_BACKEND == "mongodb":
+        require_mongodb_uri()
+        get_client()
+        get_async_client()
+    else:
+        for db_name in db_names:
+            try:
+                get_result_store(db_name).load()
+            except RuntimeError as e:
+                logging.warning(str(e))
+
+def close_storage():
+    """App shutdown."""
+    if STORAGE_BACKEND == "mongodb":
+        close_client()
+    with _stores_lock:
+        _stores.clear()
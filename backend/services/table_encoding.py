@@ -0,0 +1,99 @@
+"""
+Encodings of /dashboard/data tables besides the default JSON list of row objects,
+which repeats every column name on every row:
+  - columnar JSON ({"columns": [...], "values": [[...], ...]}, one list per column),
+    serialized with orjson;
+  - an Apache Arrow IPC stream, one record batch per chunk of rows.
+The format is picked with ?format= or negotiated from the Accept header.
+"""
+import orjson
+from database.export import ChunkSink, load_pyarrow
+from services.table_results import KEY_COLUMNS
+
+COLUMNAR_JSON_TYPE = "application/vnd.mgc.columnar+json"
+ARROW_STREAM_TYPE = "application/vnd.apache.arrow.stream"
+TABLE_FORMATS = {
+    "rows": "application/json",
+    "columnar": COLUMNAR_JSON_TYPE,
+    "arrow": ARROW_STREAM_TYPE,
+}
+# Rows per Arrow record batch when streaming.
+ARROW_BATCH_ROWS = 1000
+
+def negotiate_table_format(format=None, accept=None) -> str:
+    """
+    Return "rows", "columnar" or "arrow": the explicit format if given, else the first
+    media type of the Accept header that has an encoding (by q value), else "rows".
+    """
+    if format:
+        key = format.lower().strip()
+        if key not in TABLE_FORMATS:
+            raise ValueError(f"Unsupported format: {format} (use one of {', '.join(TABLE_FORMATS)})")
+        return key
+    by_type = {media_type: key for key, media_type in TABLE_FORMATS.items()}
+    accepted = []
+    for position, part in enumerate((accept or "").split(",")):
+        media_type, *params = [item.strip() for item in part.split(";")]
+        quality = 1.0
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    quality = float(param[2:])
+                except ValueError:
+                    quality = 0.0
+        if media_type.lower() in by_type and quality > 0:
+            accepted.append((-quality, position, by_type[media_type.lower()]))
+    return min(accepted)[2] if accepted else "rows"
+
+def columnar(rows, columns) -> dict:
+    """Column-oriented layout of the rows; a metric missing from a row is null."""
+    return {"columns": list(columns), "values": [[row.get(column) for row in rows] for column in columns]}
+
+def encode_columnar(rows, columns, **extra) -> bytes:
+    """Columnar JSON bytes, with optional extra top-level fields (e.g. next_cursor)."""
+    document = columnar(rows, columns)
+    document.update(extra)
+    return orjson.dumps(document)
+
+def arrow_schema(columns):
+    pa, _ = load_pyarrow()
+    return pa.schema([(column, pa.string()) if column in KEY_COLUMNS else (column, pa.float64())
+                      for column in columns])
+
+def record_batch(rows, schema):
+    pa, _ = load_pyarrow()
+    return pa.record_batch(
+        [pa.array([row.get(field.name) for row in rows], type=field.type) for field in schema],
+        schema=schema,
+    )
+
+def encode_arrow(rows, columns) -> bytes:
+    """The rows as a complete Arrow IPC stream (a single record batch)."""
+    pa, _ = load_pyarrow()
+    schema = arrow_schema(columns)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, schema) as writer:
+        writer.write_batch(record_batch(rows, schema))
+    return sink.getvalue().to_pybytes()
+
+async def iter_arrow(rows, columns, batch_rows=ARROW_BATCH_ROWS):
+    """
+    Encode an async iterator of rows as an Arrow IPC stream, yielding the schema and
+    then one record batch of at most batch_rows rows at a time.
+    """
+    pa, _ = load_pyarrow()
+    schema = arrow_schema(columns)
+    sink = ChunkSink()
+    writer = pa.ipc.new_stream(sink, schema)
+    yield sink.drain()
+    batch = []
+    async for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_rows:
+            writer.write_batch(record_batch(batch, schema))
+            batch = []
+            yield sink.drain()
+    if batch:
+        writer.write_batch(record_batch(batch, schema))
+    writer.close()
+    yield sink.drain()
@@ -1,10 +1,18 @@
+import os
+import base64
 import logging
-from pymongo.collection import Collection
+import orjson
+from services.metric_engine import DERIVED_FIELDS, aggregate_records, source_fields, with_derived
+from services.result_cache import result_cache
+from services.storage import ResultStore
 from utils import TableData
 
 # Configure logging if not already configured
 logging.basicConfig(level=logging.INFO)
 
+# Dataset ids fetched per query when rows are streamed or paged.
+TABLE_CHUNK_IDS = int(os.getenv("TABLE_CHUNK_IDS", "50"))
+
 # Mapping for new metric names to MongoDB document keys.
 METRIC_MAP = {
     "wacr": "compression_ratio",
@@ -19,6 +27,10 @@ METRIC_MAP = {
     "tdm": "decompression_memory",
     "pdc": "decompression_cpu",
     "tdc": "decompression_cpu",
+    "ctp": "compression_throughput",
+    "compression throughput": "compression_throughput",
+    "dtp": "decompression_throughput",
+    "decompression throughput": "decompression_throughput",
 }
 
 RESULT_METRIC_MAP = {
@@ -30,22 +42,156 @@ RESULT_METRIC_MAP = {
     "decompression_memory": "PDM (MB)",
     "compression_cpu": "PCC (%)",
     "decompression_cpu": "PDC (%)",
+    "compression_throughput": "CTP (MB/s)",
+    "decompression_throughput": "DTP (MB/s)",
+}
+
+# Dataset ID of the rows aggregated over the selected datasets (TableData.aggregate).
+AGGREGATE_ROW_IDS = {
+    "total": "Selection Total",
+    "peak": "Selection Peak",
+    "mean": "Selection Mean",
 }
 
+def encode_cursor(db_name: str, row: dict) -> str:
+    """Continuation token pointing after `row`: its corpus and (dataset_id, compressor, compressor_type)."""
+    key = [db_name, row["Dataset ID"], row["Compressor"], row["Compressor Type"]]
+    return base64.urlsafe_b64encode(orjson.dumps(key)).decode("ascii").rstrip("=")
+
+def decode_cursor(token: str):
+    """Return (db_name, (dataset_id, compressor, compressor_type)) of a cursor; raises ValueError."""
+    try:
+        db_name, dataset_id, comp_name, comp_type_str = orjson.loads(
+            base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {token}") from e
+    return db_name, (dataset_id, comp_name, comp_type_str)
+
+# Leading columns of every table row.
+KEY_COLUMNS = ["Dataset ID", "Compressor", "Compressor Type"]
+
+def table_columns(metrics) -> list:
+    """Column names of a table with the given (METRIC_MAP-resolved) metric fields."""
+    return KEY_COLUMNS + list(dict.fromkeys(RESULT_METRIC_MAP[metric] for metric in metrics))
+
 class TabularData:
     @staticmethod
-    def fetch_grouped_results(collection: Collection, input_data: TableData) -> dict:
+    def fetch_grouped_results(store: ResultStore, input_data: TableData) -> dict:
         """
-        Fetches grouped results from a MongoDB collection based on input_data.
+        Fetches grouped results from a corpus store (MongoDB or Parquet snapshot) based on input_data.
         Expects input_data to have:
           - id: list of dataset IDs
           - comp_type: list of flags (e.g., [1, 0]) mapping to comp types (0 -> standard, 1 -> proposed)
           - standard_comp_name: list of standard compressor names
           - proposed_comp_name: list of proposed compressor names
           - metric: list of metrics (string) to be fetched
+        All the requested combinations are fetched with a single query, then ordered in memory;
+        the fetched documents are kept in the result cache until the data generation changes.
+        Derived metrics (WACR, throughput) are computed per row, and the rows of
+        input_data.aggregate (total / peak / mean over the selected datasets) follow the dataset rows.
         """
-        results = []
+        plan = TabularData._query_plan(input_data)
+        if plan is None:
+            return []
+        keys, metrices = plan
+        docs = TabularData._fetch(store, keys, metrices)
+        return (TabularData._rearrange(TabularData._rows(docs, keys, metrices), input_data) +
+                TabularData._aggregate_rows(docs, keys, metrices, input_data.aggregate))
+
+    @staticmethod
+    async def fetch_grouped_results_async(store: ResultStore, input_data: TableData) -> list:
+        """Async version of fetch_grouped_results."""
+        plan = TabularData._query_plan(input_data)
+        if plan is None:
+            return []
+        keys, metrices = plan
+        docs = await TabularData._fetch_async(store, keys, metrices)
+        return (TabularData._rearrange(TabularData._rows(docs, keys, metrices), input_data) +
+                TabularData._aggregate_rows(docs, keys, metrices, input_data.aggregate))
+
+    @staticmethod
+    def columns(input_data: TableData) -> list:
+        """Column names of the table requested by input_data (see table_columns)."""
+        plan = TabularData._query_plan(input_data)
+        return table_columns(plan[1]) if plan is not None else list(KEY_COLUMNS)
+
+    @staticmethod
+    def resume_plan(stores: list, input_data: TableData, after=None) -> list:
+        """
+        Return [(store, keys, start, metrics)]: the rows still to send for the corpora of
+        `stores`, in response order (corpus, dataset id, standard then proposed compressors).
+        `after` is the (db_name, (dataset_id, compressor, compressor_type)) of the last row
+        already sent, as decoded from a cursor; raises ValueError when it is not part of this request.
+        """
+        plan = TabularData._query_plan(input_data)
+        if plan is None:
+            return []
+        keys, metrices = plan
+        if after is None:
+            return [(store, keys, 0, metrices) for store in stores]
+        db_name, key = after
+        db_names = [store.db_name for store in stores]
+        if db_name not in db_names or key not in keys:
+            raise ValueError("The cursor does not belong to this request")
+        position = db_names.index(db_name)
+        return ([(stores[position], keys, keys.index(key) + 1, metrices)] +
+                [(store, keys, 0, metrices) for store in stores[position + 1:]])
+
+    @staticmethod
+    async def iter_rows_async(resume_plan: list, chunk_ids: int = TABLE_CHUNK_IDS):
+        """
+        Yield (db_name, row) in response order, fetching the rows of `chunk_ids` dataset ids
+        per query, so memory is bounded by a chunk rather than the whole selection. Chunks are
+        aligned on the request's dataset ids, so a resumed page reuses the cached chunk.
+        """
+        for store, keys, start, metrices in resume_plan:
+            for offset, chunk in TabularData._chunks(keys, chunk_ids):
+                if offset + len(chunk) <= start:
+                    continue
+                docs = await TabularData._fetch_async(store, chunk, metrices)
+                for row in TabularData._rows(docs, chunk[max(start - offset, 0):], metrices):
+                    yield store.db_name, row
+
+    @staticmethod
+    def cache_key(store: ResultStore, keys, metrics) -> tuple:
+        """
+        Canonical form of a request for the result cache: the corpus, the sorted dataset ids,
+        the sorted (alias-normalized) compressors of each type and the sorted metric fields.
+        Requests differing only in order share an entry; the order is applied by _rearrange.
+        """
+        dataset_ids, compressors_by_type = TabularData._batch(keys)
+        return (
+            store.db_name,
+            tuple(sorted(dataset_ids)),
+            tuple((comp_type_str, tuple(sorted(compressors)))
+                  for comp_type_str, compressors in sorted(compressors_by_type.items())),
+            tuple(sorted(set(metrics))),
+        )
+
+    @staticmethod
+    def _generation(store: ResultStore):
+        """Data generation of the store, or None (no caching) when it cannot be read."""
+        try:
+            return store.generation()
+        except Exception as e:
+            logging.warning("Could not read the data generation of %s: %s", store.db_name, e)
+            return None
+
+    @staticmethod
+    async def _generation_async(store: ResultStore):
+        """Async version of _generation."""
+        try:
+            return await store.generation_async()
+        except Exception as e:
+            logging.warning("Could not read the data generation of %s: %s", store.db_name, e)
+            return None
 
+    @staticmethod
+    def _query_plan(input_data: TableData):
+        """
+        Return ([(dataset_id, compressor, compressor_type)] to look up, normalized metrics),
+        or None when the comp_type flags cannot be mapped.
+        """
         try:
             # Map comp_type index to type string.
             comp_type_map = {0: "standard", 1: "proposed"}
@@ -53,7 +199,7 @@ class TabularData:
                               for i, flag in enumerate(input_data.comp_type) if flag == 1]
         except Exception as e:
             logging.error("Error processing comp_type mapping: %s", e, exc_info=True)
-            return results  # Return empty results or re-raise exception if needed
+            return None  # Return empty results or re-raise exception if needed
         
         metrices = []
         
@@ -68,6 +214,7 @@ class TabularData:
             logging.info("Normalized metric '%s' to '%s'", metric_key, metric)
         
         logging.info("Metrics to be processed: %s", metrices)
+        keys = []
         # Loop over each dataset.   
         for dataset_id in input_data.id:
             # Process standard compressors.
@@ -76,19 +223,18 @@ class TabularData:
                     if comp_name:  # Skip if None or empty string.
                         if comp_name == "7zip":
                             comp_name = "7-zip"
-                        TabularData._process_query(
-                            collection, dataset_id, comp_name, "standard", metrices, results
-                        )
+                        keys.append((dataset_id, comp_name, "standard"))
             # Process proposed compressors.
             if "proposed" in selected_types:
                 for comp_name in input_data.proposed_comp_name:
                     if comp_name:
                         if comp_name == "7zip":
                             comp_name = "7-zip"
-                        TabularData._process_query(
-                            collection, dataset_id, comp_name, "proposed", metrices, results
-                        )
+                        keys.append((dataset_id, comp_name, "proposed"))
+        return keys, metrices
 
+    @staticmethod
+    def _rearrange(results: list, input_data: TableData) -> list:
         # Rearrange results: group by compressor type, preserve compressor order
         rearranged = []
         # Build a lookup for quick access
@@ -110,20 +256,126 @@ class TabularData:
         return rearranged
 
     @staticmethod
-    def _process_query(collection: Collection, dataset_id, comp_name, comp_type_str, metrics, results: list):
+    def _batch(keys):
+        """The dataset ids and {compressor_type: [compressor, ...]} covering all the keys."""
+        dataset_ids = list(dict.fromkeys(dataset_id for dataset_id, _, _ in keys))
+        compressors_by_type = {}
+        for _, comp_name, comp_type_str in keys:
+            compressors = compressors_by_type.setdefault(comp_type_str, [])
+            if comp_name not in compressors:
+                compressors.append(comp_name)
+        return dataset_ids, compressors_by_type
+
+    @staticmethod
+    def _find(store: ResultStore, keys, metrics):
+        """
+        Fetch the documents of all the keys in a single query, projected on the
+        requested metric fields (the inputs of derived ones), or None when the query fails.
+        """
+        if not keys:
+            return []
+        dataset_ids, compressors_by_type = TabularData._batch(keys)
+        logging.info("Querying %s for %d dataset(s), compressors %s",
+                     store.db_name, len(dataset_ids), compressors_by_type)
+        try:
+            return store.find_results(dataset_ids, compressors_by_type, source_fields(metrics))
+        except Exception as e:
+            logging.error("Database query failed for %s: %s", store.db_name, e, exc_info=True)
+            return None
+
+    @staticmethod
+    async def _find_async(store: ResultStore, keys, metrics):
+        """Async version of _find."""
+        if not keys:
+            return []
+        dataset_ids, compressors_by_type = TabularData._batch(keys)
+        logging.info("Querying %s for %d dataset(s), compressors %s",
+                     store.db_name, len(dataset_ids), compressors_by_type)
         try:
-            # Build the query filter.
-            query_filter = {
-                "dataset_id": dataset_id,
-                "compressor": comp_name,
-                "compressor_type": comp_type_str
-            }
-            logging.info("Querying MongoDB with filter: %s", query_filter)
-            # Fetch matching documents.
-            docs = list(collection.find(query_filter))
+            return await store.find_results_async(dataset_ids, compressors_by_type, source_fields(metrics))
         except Exception as e:
-            logging.error("Database query failed for dataset_id %s, compressor %s, type %s: %s",
-                          dataset_id, comp_name, comp_type_str, e, exc_info=True)
+            logging.error("Database query failed for %s: %s", store.db_name, e, exc_info=True)
+            return None
+
+    @staticmethod
+    def _rows(docs, keys, metrics) -> list:
+        """Group the fetched documents by key and build the result rows of `keys`, in key order."""
+        if docs is None:
+            return []
+        docs_by_key = {}
+        for doc in with_derived(docs, metrics):
+            docs_by_key.setdefault((doc["dataset_id"], doc["compressor"], doc["compressor_type"]), []).append(doc)
+        results = []
+        for dataset_id, comp_name, comp_type_str in keys:
+            TabularData._process_docs(docs_by_key.get((dataset_id, comp_name, comp_type_str), []),
+                                      dataset_id, comp_name, comp_type_str, metrics, results)
+        return results
+
+    @staticmethod
+    def _aggregate_rows(docs, keys, metrics, stats) -> list:
+        """
+        Rows aggregating each requested compressor over the selected datasets (shipped
+        Total / Peak / WACR rows excluded), one per statistic of `stats`: total, peak or mean.
+        The total of a derived metric (WACR, throughput) is its size-weighted value.
+        """
+        if not docs or not stats:
+            return []
+        groups = aggregate_records(docs, metrics)
+        rows = []
+        for stat in stats:
+            stat = stat.lower().strip()
+            if stat not in AGGREGATE_ROW_IDS:
+                logging.warning("Aggregate '%s' is not recognized. Skipping.", stat)
+                continue
+            for comp_name, comp_type_str in dict.fromkeys((comp, ctype) for _, comp, ctype in keys):
+                values = groups.get((comp_name.strip().lower(), comp_type_str))
+                if values is None:
+                    continue
+                row = {"Dataset ID": AGGREGATE_ROW_IDS[stat], "Compressor": comp_name, "Compressor Type": comp_type_str}
+                for metric in metrics:
+                    name = f"weighted_{metric}" if stat == "total" and metric in DERIVED_FIELDS else f"{stat}_{metric}"
+                    row[RESULT_METRIC_MAP[metric]] = values.get(name)
+                rows.append(row)
+        return rows
+
+    @staticmethod
+    def _chunks(keys, chunk_ids):
+        """Split the ordered keys into runs covering at most `chunk_ids` dataset ids; yields (offset, keys)."""
+        start, seen = 0, 0
+        for i in range(1, len(keys) + 1):
+            if i == len(keys) or keys[i][0] != keys[i - 1][0]:
+                seen += 1
+                if seen == chunk_ids or i == len(keys):
+                    yield start, keys[start:i]
+                    start, seen = i, 0
+
+    @staticmethod
+    def _fetch(store: ResultStore, keys, metrics):
+        """The documents of `keys`, from the result cache when the data generation is unchanged."""
+        cache_key = TabularData.cache_key(store, keys, metrics)
+        generation = TabularData._generation(store)
+        docs = result_cache.get(cache_key, generation)
+        if docs is None:
+            docs = TabularData._find(store, keys, metrics)
+            if docs is not None:
+                result_cache.put(cache_key, generation, docs)
+        return docs
+
+    @staticmethod
+    async def _fetch_async(store: ResultStore, keys, metrics):
+        """Async version of _fetch."""
+        cache_key = TabularData.cache_key(store, keys, metrics)
+        generation = await TabularData._generation_async(store)
+        docs = result_cache.get(cache_key, generation)
+        if docs is None:
+            docs = await TabularData._find_async(store, keys, metrics)
+            if docs is not None:
+                result_cache.put(cache_key, generation, docs)
+        return docs
+
+    @staticmethod
+    def _process_docs(docs, dataset_id, comp_name, comp_type_str, metrics, results: list):
+        if docs is None:
             return
 
         if not len(docs):
@@ -138,6 +390,7 @@ class TabularData:
         }
 
         for metric in metrics:
+            column = RESULT_METRIC_MAP[metric]
             try:
                 # Normalize the metric key.
                 # metric_key = metric.lower().strip()
@@ -146,23 +399,19 @@ class TabularData:
                 db_field = metric.lower().strip()
                 logging.info("DB field for metric '%s': %s", metric, db_field)
                 if not db_field:
-                    result_dict[metric] = None
+                    result_dict[column] = None
                     continue
 
                 # Compute the desired value based on the metric type.
                 values = [doc.get(db_field, 0) for doc in docs if doc.get(db_field) is not None]
                 if not values:
-                    result_dict[metric] = None
-                # elif "p" in db_field:
-                #     result_dict[metric] = max(values)
-                # elif "t" in db_field:
-                #     result_dict[metric] = sum(values)
+                    result_dict[column] = None
                 else:
                     # Fallback: take the first document's value.
-                    result_dict[RESULT_METRIC_MAP[metric]] = values[0]
+                    result_dict[column] = values[0]
             except Exception as e:
                 logging.error("Error processing metric '%s' for dataset_id %s, compressor %s: %s",
                               metric, dataset_id, comp_name, e, exc_info=True)
-                result_dict[metric] = None
+                result_dict[column] = None
 
         results.append(result_dict)
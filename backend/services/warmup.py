@@ -0,0 +1,120 @@
+"""
+Background warmup of the figure cache: every chart the dashboard loads (see
+charts.dashboard_charts) is built at startup, a few at a time, so no visitor pays for
+a cold build. Ingestion runs out of process and bumps the data generation of the
+corpora it touched; the warmup polls those generations and rebuilds the charts when
+one changes. Progress is reported by status() (GET /dashboard/ready).
+"""
+import os
+import time
+import asyncio
+import logging
+from services.charts import chart_corpora, corpus_generation, dashboard_charts
+
+CHART_WARMUP = os.getenv("CHART_WARMUP", "true").lower() in ("1", "true", "yes")
+# Charts built at the same time.
+WARMUP_CONCURRENCY = int(os.getenv("WARMUP_CONCURRENCY", "4"))
+# Seconds between two checks of the data generations.
+WARMUP_POLL_SECONDS = float(os.getenv("WARMUP_POLL_SECONDS", "30"))
+# Chart formats to build, comma separated (see charts.CHART_FORMATS).
+WARMUP_FORMATS = [f.strip() for f in os.getenv("WARMUP_FORMATS", "html").split(",") if f.strip()]
+
+class ChartWarmup:
+    def __init__(self, formats=WARMUP_FORMATS, concurrency=WARMUP_CONCURRENCY, poll_seconds=WARMUP_POLL_SECONDS):
+        self.formats = formats
+        self.concurrency = max(1, concurrency)
+        self.poll_seconds = poll_seconds
+        self._task = None
+        self.generations = {}  # db name -> generation the charts were last warmed at
+        self.runs = 0
+        self.warmed = False  # set by the first run that built every chart
+        self.total = 0
+        self.done = 0
+        self.failed = []
+        self.running = False
+        self.started_at = None
+        self.finished_at = None
+
+    async def current_generations(self):
+        corpora = chart_corpora()
+        generations = await asyncio.gather(*(corpus_generation(db_name) for db_name in corpora))
+        return dict(zip(corpora, generations))
+
+    async def run_once(self):
+        """Build every dashboard chart of the current data; returns the number of failures."""
+        charts = dashboard_charts(self.formats)
+        generations = await self.current_generations()
+        self.running = True
+        self.total, self.done, self.failed = len(charts), 0, []
+        self.started_at, self.finished_at = time.time(), None
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def warm(name, build):
+            async with semaphore:
+                try:
+                    await build()
+                except Exception as e:
+                    logging.warning(f"Warmup of chart {name} failed: {e}")
+                    self.failed.append(name)
+                finally:
+                    self.done += 1
+
+        try:
+            await asyncio.gather(*(warm(name, build) for name, build in charts))
+        finally:
+            self.running = False
+            self.finished_at = time.time()
+            self.runs += 1
+        self.generations = generations
+        if not self.failed:
+            self.warmed = True
+        logging.info(f"Warmed {self.total - len(self.failed)}/{self.total} charts in "
+                     f"{self.finished_at - self.started_at:.1f}s")
+        return len(self.failed)
+
+    async def watch(self):
+        """Warm the charts, then again whenever the data generation of a corpus changes."""
+        while True:
+            try:
+                if not self.runs or self.failed or await self.current_generations() != self.generations:
+                    await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logging.exception("Chart warmup failed")
+            await asyncio.sleep(self.poll_seconds)
+
+    def start(self):
+        if CHART_WARMUP and self._task is None:
+            self._task = asyncio.ensure_future(self.watch())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def status(self):
+        """
+        Warmup progress. Once a run has built every chart the app stays ready: later
+        re-warms (running) and failed charts (served cold or stale) are only reported.
+        """
+        return {
+            "enabled": CHART_WARMUP,
+            "ready": not CHART_WARMUP or self.warmed,
+            "running": self.running,
+            "runs": self.runs,
+            "total": self.total,
+            "done": self.done,
+            "failed": list(self.failed),
+            "generations": self.generations,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+# Started by the app lifespan.
+chart_warmup = ChartWarmup()
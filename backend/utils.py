@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 
 class ScatterPlotData(BaseModel):
     name: str
@@ -7,6 +7,7 @@ class ScatterPlotData(BaseModel):
 class MetricsPlotData(BaseModel):
     genomeType: str
     name: str
+    datasets: Optional[List[str]] = None     # dataset ids to aggregate over (all datasets when omitted)
     
 class TableData(BaseModel):
     id: List[str]
@@ -15,4 +16,5 @@ class TableData(BaseModel):
     standard_comp_name: List[str]      # standard compressor names
     proposed_comp_name: List[str]      # proposed compressor names
     metric: List[str]          # col-names
+    aggregate: List[str] = []  # [total, peak, mean] rows computed over the selected ids
         
\ No newline at end of file